@@ -5,80 +5,395 @@ Responsible for the file handling, so this is called from the cli, and returns t
 """
 
 import argparse
-import re
+import mmap
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from functools import partial
+import callgraph
+import golden
+import jack_bin
 import jack_xml
 import tokenizer
+import vm_optimizer
 from compiler import Compiler
+from code_generator import CodeGenerator
+from build_cache import BuildCache
 
 class Analyzer:
     def __init__(self, file):
-        self.file = self.process_file(file)
+        #Comments are skipped by the tokenizer as it scans, so the source is kept as it is
+        self.file = file
 
     def tokenize(self):
         tokenize = tokenizer.Tokenizer(self.file)
         return tokenize.tokenize(self.file)
 
-    def test_tokenizer(self):
+    def test_tokenizer(self, stream = None):
+        """
+        Returns the tokens as XML, or writes them to stream if one is given
+        """
         tokenized = self.tokenize()
         token_xml = [token.toXML() for token in tokenized]
-        return jack_xml.XML("tokens", token_xml).display()
+        tokens = jack_xml.XML("tokens", token_xml)
+        if stream:
+            tokens.write(stream)
+        else:
+            return tokens.display()
     
     def compile(self):
         compiler = Compiler(self.file)
-        return compiler.compileClass()
+        try:
+            return compiler.compileClass()
+        finally:
+            #Stop the scan even if parsing stopped early, so it lets go of the source, which may be an mmap
+            compiler.tokens.close()
+
+    def check(self):
+        """
+        Parses the class in recovery mode, and returns every syntax error found as a list of CompileErrors in the
+        order they appear in the file
+        """
+        compiler = Compiler(self.file, recover = True)
+        try:
+            compiler.compileClass()
+        finally:
+            compiler.tokens.close()
+        return sorted(compiler.diagnostics, key = lambda error: (error.line or 0, error.column or 0))
 
-    def process_file(self, file):
+    def compile_vm(self, tree = None, optimize = False, keep = None):
         """
-        Removes comments and whitespace from file
+        Returns a VMWriter holding the VM code for the class
+        tree is the parse tree from compile(), which is built if not given
+        keep is the set of subroutines to generate code for, as for CodeGenerator.compileClass
         """
-        #Matches anything like /** ... */ or /* ... */ (or more *)
-        file_lines = file.split("\n")
+        if tree is None:
+            tree = self.compile()
+        writer = CodeGenerator().compileClass(tree, keep)
+        if optimize:
+            writer.commands = vm_optimizer.optimize(writer.commands)
+        return writer
 
-        filtered_lines =[re.sub("\/\/.*", "", line) for line in file_lines]
-        no_singleline_comment = " ".join(filtered_lines)
-        no_multiline_comments = re.sub("\/\*+.*?\*\/", "", no_singleline_comment) 
+def compileSource(source, outputs = ('xml', 'vm'), optimize = False):
+    """
+    Compiles the text of a .jack file without touching the filesystem
+    Returns a dict from each of outputs - 'tokens', 'xml' or 'vm' - to its text
+    """
+    analyzer = Analyzer(source)
+    compiled = {}
+    if 'tokens' in outputs:
+        compiled['tokens'] = analyzer.test_tokenizer()
+    if 'xml' in outputs or 'vm' in outputs:
+        tree = analyzer.compile()
+        if 'xml' in outputs:
+            compiled['xml'] = tree.display()
+        if 'vm' in outputs:
+            compiled['vm'] = analyzer.compile_vm(tree, optimize).display()
+    return compiled
 
-        return no_multiline_comments
-    
-def compileFile(file_path):
-    """Processes a .jack file"""
-    with open(file_path, 'r') as f: 
-        analyzer = Analyzer(f.read())
-    
-    out_file_path = os.path.splittext(file_path)[0] + '.xml'
-    with open(out_file_path, 'w') as o:
-        o.write(analyzer.compile())
+#Files at least this size are memory-mapped rather than read
+MMAP_THRESHOLD = 1024 * 1024
+
+def mapSource(f):
+    """
+    Returns the contents of the open file f as a bytes-like object, for use as a context manager
+    Files of MMAP_THRESHOLD bytes or more are memory-mapped, so they are never copied into memory as a whole.
+    A mapped file that is truncated while it is read, as some editors do when saving, kills the process with
+    SIGBUS, so smaller files, which is nearly every .jack file, are read into memory instead. The memory saved
+    by mapping them would be negligible
+    """
+    if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+        return memoryview(f.read())
+    return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+def compileFile(file_path, cache = None, optimize = False, binary = False):
+    """
+    Processes a .jack file, writing its parse tree to a .xml file and its VM code to a .vm file next to it
+    If binary is true, the parse tree is also written in the format of jack_bin to a .jbin file
+    If a BuildCache is given and already holds the output for this source, that is reused instead
+
+    Returns the number of VM commands as (unoptimized, written), or None if the output came from the cache
+    """
+    out_paths = outputPaths(file_path, binary)
+    with open(file_path, 'rb') as f, mapSource(f) as source:
+        if cache:
+            key = cache.key(source, options = 'O' if optimize else '')
+            if cache.fetch(key, out_paths):
+                return None
+
+        #The tokenizer scans the bytes directly, so the source is never decoded as a whole
+        analyzer = Analyzer(source)
+        tree = analyzer.compile()
+    vm_counts = writeOutputs(analyzer, tree, out_paths, optimize)
+
+    if cache:
+        cache.store(key, out_paths)
+    return vm_counts
+
+def noPhase(name):
+    return nullcontext()
+
+def writeOutputs(analyzer, tree, out_paths, optimize = False, keep = None, phase = noPhase):
+    """
+    Writes the outputs for a parsed class to out_paths, a dict from suffix to path: '.xml' and '.vm', and '.jbin'
+    if the binary tree is wanted. keep is as for Analyzer.compile_vm
+    phase is called with the name of each step, and the context manager it returns wraps that step, as
+    Profiler.phase does
+    Returns the number of VM commands as (unoptimized, written)
+    """
+    with phase('xml'), open(out_paths['.xml'], 'w') as o:
+        tree.write(o)
+    if '.jbin' in out_paths:
+        with phase('jbin'):
+            jack_bin.writeTree(tree, out_paths['.jbin'])
+    with phase('codegen'):
+        writer = analyzer.compile_vm(tree, keep = keep)
+    vm_counts = (len(writer.commands), len(writer.commands))
+    if optimize:
+        with phase('optimize'):
+            writer.commands = vm_optimizer.optimize(writer.commands)
+        vm_counts = (vm_counts[0], len(writer.commands))
+    with phase('vm'), open(out_paths['.vm'], 'w') as o:
+        writer.write(o)
+    return vm_counts
+
+def outputPaths(file_path, binary = False):
+    """Returns the paths of the outputs for a .jack file, as a dict from suffix to path"""
+    base_path = os.path.splitext(file_path)[0]
+    out_paths = {'.xml': base_path + '.xml', '.vm': base_path + '.vm'}
+    if binary:
+        out_paths['.jbin'] = base_path + '.jbin'
+    return out_paths
+
+def compileProject(file_paths, optimize = False, binary = False):
+    """
+    Compiles the .jack files of one program together, leaving out the code for every subroutine that can't be
+    reached from Sys.init or Main.main. If there is neither, nothing is left out
+    Returns (results, subroutines, kept): the results as compileFiles gives them, how many subroutines there are
+    in all, and how many of them were generated
+    """
+    results = {}
+    parsed = {}
+    graph = callgraph.CallGraph()
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'r') as f:
+                analyzer = Analyzer(f.read())
+            tree = analyzer.compile()
+        except Exception as e:
+            results[file_path] = (file_path, f"{type(e).__name__}: {e}", None)
+            continue
+        parsed[file_path] = (analyzer, tree)
+        graph.addClass(tree)
+
+    keep = graph.reachable()
+    if not keep:
+        keep = None
+    for file_path, (analyzer, tree) in parsed.items():
+        try:
+            vm_counts = writeOutputs(analyzer, tree, outputPaths(file_path, binary), optimize, keep)
+        except Exception as e:
+            results[file_path] = (file_path, f"{type(e).__name__}: {e}", None)
+            continue
+        results[file_path] = (file_path, None, vm_counts)
+
+    subroutines = len(graph.subroutines)
+    return [results[file_path] for file_path in file_paths], subroutines, subroutines if keep is None else len(keep)
+
+def checkFile(file_path):
+    """
+    Checks a .jack file for syntax errors without writing any output
+    Returns (file_path, diagnostics), where diagnostics is the list of CompileErrors from Analyzer.check
+    """
+    with open(file_path, 'rb') as f, mapSource(f) as source:
+        return file_path, Analyzer(source).check()
+
+def compareFiles(references):
+    """
+    Compares the output for each .jack file with its references, given as a dict from the file to a list of
+    reference paths, printing the first difference for each file that doesn't match
+    Returns 1 if any file differs or has no reference, otherwise 0
+    """
+    failures = 0
+    for file_path, reference_paths in references.items():
+        if not reference_paths:
+            print(f"{file_path}: no reference found")
+            failures += 1
+            continue
+        with open(file_path, 'r') as f:
+            source = f.read()
+        for reference_path in reference_paths:
+            try:
+                difference = golden.compareSource(source, reference_path)
+            except Exception as e:
+                difference = f"{type(e).__name__}: {e}"
+            if difference:
+                print(f"{file_path} against {reference_path}: {difference}")
+                failures += 1
+                break
+    print(f"Compared {len(references)} files, {failures} differed")
+    return 1 if failures else 0
+
+def tryCompileFile(file_path, cache = None, optimize = False, binary = False):
+    """
+    Compiles a .jack file, catching any error so that one bad file doesn't stop a batch
+    Returns (file_path, error, vm_counts), where error is a message or None on success, and vm_counts is as
+    returned by compileFile
+    """
+    try:
+        vm_counts = compileFile(file_path, cache, optimize, binary)
+    except Exception as e:
+        return file_path, f"{type(e).__name__}: {e}", None
+    return file_path, None, vm_counts
+
+def findJackFiles(directory):
+    """Returns the paths of all .jack files under directory"""
+    jack_files = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.jack'):
+                jack_files.append(os.path.join(root, file))
+    return jack_files
+
+def compileFiles(file_paths, jobs = 1, cache = None, optimize = False, binary = False):
+    """
+    Compiles every file in file_paths, spread over a pool of jobs processes if jobs > 1
+    Returns the (file_path, error, vm_counts) from tryCompileFile for each file
+    """
+    compile_one = partial(tryCompileFile, cache = cache, optimize = optimize, binary = binary)
+    if jobs > 1 and len(file_paths) > 1:
+        #Hand out files in chunks so the per-task overhead doesn't dominate for thousands of small files
+        chunksize = max(1, len(file_paths) // (jobs * 4))
+        results = []
+        with ProcessPoolExecutor(max_workers = jobs) as pool:
+            try:
+                results.extend(pool.map(compile_one, file_paths, chunksize = chunksize))
+            except BrokenProcessPool as e:
+                #A worker was killed, by a signal for instance, which loses every result not yet collected
+                error = f"{type(e).__name__}: {e}"
+                results.extend((file_path, error, None) for file_path in file_paths[len(results):])
+    else:
+        results = [compile_one(file_path) for file_path in file_paths]
+
+    if cache:
+        cache.evict()
+    return results
+
+def printSummary(results):
+    """Prints how many files compiled and the error for each one that didn't"""
+    failures = 0
+    for file_path, error, vm_counts in results:
+        if error:
+            print(f"{file_path}: {error}")
+            failures += 1
+    print(f"Compiled {len(results) - failures} of {len(results)} files, {failures} failed")
+    return failures
+
+def printVMReport(results):
+    """Prints how many VM commands the optimizer removed from each file, and in total"""
+    total_before = total_after = 0
+    for file_path, error, vm_counts in results:
+        if error:
+            continue
+        elif vm_counts is None:
+            print(f"{file_path}: cached")
+        else:
+            before, after = vm_counts
+            total_before += before
+            total_after += after
+            print(f"{file_path}: {before} -> {after} VM commands")
+    if total_before:
+        print(f"Total: {total_before} -> {total_after} VM commands ({(total_before - total_after) / total_before:.1%} removed)")
  
 def main():
+    #Imported here, as profiler itself builds on this module
+    import profiler
+
     parser = argparse.ArgumentParser(description="Process .jack files")
-    parser.add_argument('filename', help="The name of the file to process")
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-f', '--file', help='Path to a .jack file.', type=str)
     group.add_argument('-d', '--directory', help='Path to directory containing .jack files.', type=str)
+    group.add_argument('--serve', help='Run as a compile server listening on this Unix socket path.', type=str, metavar='SOCKET')
+    parser.add_argument('-j', '--jobs', help='Number of files to compile in parallel, 0 for one per CPU. Defaults to 1.', type=int, default=1)
+    parser.add_argument('-O', '--optimize', help='Optimize the VM code and report how many commands were removed.', action='store_true')
+    parser.add_argument('--no-cache', help='Compile every file, without reading or updating the build cache.', action='store_true')
+    parser.add_argument('--cache-dir', help='Directory for the build cache. Defaults to $XDG_CACHE_HOME/jack-compiler.', type=str)
+    parser.add_argument('--cache-size', help='Maximum size of the build cache in MB. Defaults to 64.', type=int, default=64)
+    parser.add_argument('--binary', help='Also write each parse tree in the compact binary format to a .jbin file.', action='store_true')
+    parser.add_argument('--prune', help='Compile the files as one program, leaving out subroutines that can\'t be reached from Sys.init or Main.main. Doesn\'t use the cache or parallel jobs.', action='store_true')
+    parser.add_argument('--compare-to', help='Compare the output with reference XML instead of writing it: a file with -f, or a directory of Name.xml and NameT.xml files laid out as the -d directory.', type=str, metavar='PATH')
+    parser.add_argument('--check', help='Only check for syntax errors, reporting all of them in each file without writing any output.', action='store_true')
+    parser.add_argument('--profile', help='Compile one file at a time without the cache, and write a profile of each phase to this path.', type=str, metavar='PATH')
+    parser.add_argument('--profile-format', help='Format of the profile: json, or collapsed stacks for flame graphs. Defaults to json.', choices=profiler.FORMATS, default='json')
+    parser.add_argument('--profile-memory', help='Also record the peak memory of each phase. Slows every phase down.', action='store_true')
+    parser.add_argument('--watch', help='Keep running, and recompile each .jack file as soon as it changes. Can\'t be combined with --compare-to, --check, --prune or --profile.', action='store_true')
 
     args = parser.parse_args()
+    jobs = args.jobs or os.cpu_count()
+    if args.watch and (args.compare_to or args.check or args.prune or args.profile):
+        parser.error("--watch can't be combined with --compare-to, --check, --prune or --profile")
 
-    if args.file:
+    if args.serve:
+        #Imported here, as compile_server itself builds on this module
+        from compile_server import serve
+        serve(args.serve)
+        return 0
+    elif args.file:
         # If a file path is provided, check if it's a .jack file.
         if args.file.endswith('.jack'):
-            compileFile(args.file)
+            file_paths = [args.file]
         else:
             print(f"{args.file} is not a .jack file. Skipping.")
+            return 0
     elif args.directory:
         # If a directory path is provided, process all .jack files in that directory.
         if os.path.isdir(args.directory):
-            for root, dirs, files in os.walk(args.directory):
-                for file in files:
-                    if file.endswith('.jack'):
-                        compileFile(os.path.join(root, file))
+            file_paths = findJackFiles(args.directory)
         else:
             print(f"{args.directory} is not a valid directory. Exiting.")
+            return 1
 
-    with open(args.filename, 'r') as f:
-        file_content = f.read()
+    if args.watch:
+        #Imported here, as watcher itself builds on this module
+        from watcher import Watcher, watch
+        if args.file:
+            watcher = Watcher(file_paths = file_paths)
+        else:
+            watcher = Watcher(directory = args.directory)
+        cache = None if args.no_cache else BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        return watch(watcher, jobs, cache, args.optimize, args.binary)
+    elif args.compare_to:
+        if args.file:
+            references = {args.file: [args.compare_to]}
+        else:
+            references = {file_path: golden.referencePaths(file_path, args.directory, args.compare_to) for file_path in file_paths}
+        return compareFiles(references)
+    elif args.check:
+        errors = 0
+        for file_path, diagnostics in map(checkFile, file_paths):
+            for error in diagnostics:
+                print(f"{file_path}: {error}")
+            errors += len(diagnostics)
+        print(f"Checked {len(file_paths)} files, {errors} errors")
+        return 1 if errors else 0
+    elif args.prune:
+        results, subroutines, kept = compileProject(file_paths, args.optimize, args.binary)
+        print(f"Generated {kept} of {subroutines} subroutines, the rest can't be reached from {' or '.join(callgraph.ENTRY_POINTS)}")
+    elif args.profile:
+        profile = profiler.Profiler(memory = args.profile_memory)
+        results = profiler.profileFiles(file_paths, profile, args.optimize, args.binary)
+        profile.write(args.profile, args.profile_format)
+    else:
+        cache = None if args.no_cache else BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        results = compileFiles(file_paths, jobs, cache, args.optimize, args.binary)
+    if args.optimize:
+        printVMReport(results)
+    failures = printSummary(results)
+    return 1 if failures else 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
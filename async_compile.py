@@ -0,0 +1,86 @@
+"""
+async_compile.py
+
+An asyncio API for compiling many .jack files or sources, for services that can't block their event loop.
+File reads and writes run in the loop's default thread pool, and the compiling itself runs in a given executor,
+e.g. a ProcessPoolExecutor, so it doesn't hold the GIL against the loop.
+
+    async for name, error, compiled in compile_many(['Main.jack', ('Inline', source)], executor = pool):
+        ...
+"""
+
+import asyncio
+import os
+from analyzer import compileSource
+
+DEFAULT_LIMIT = 8
+#The file each output is written to, after the path without its .jack, following the nand2tetris names
+SUFFIXES = {'tokens': 'T.xml', 'xml': '.xml', 'vm': '.vm'}
+
+def tryCompileSource(source, outputs, optimize):
+    """
+    Compiles source in an executor, catching any error so it comes back as a message rather than being pickled
+    Returns (error, compiled), where error is a message or None on success, and compiled is as from compileSource
+    """
+    try:
+        return None, compileSource(source, outputs, optimize)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+
+def readSource(file_path):
+    with open(file_path, 'r') as f:
+        return f.read()
+
+def writeOutputs(file_path, compiled):
+    """Writes each output in compiled next to file_path, e.g. 'vm' to Main.vm and 'tokens' to MainT.xml"""
+    base_path = os.path.splitext(file_path)[0]
+    for output, text in compiled.items():
+        with open(base_path + SUFFIXES[output], 'w') as o:
+            o.write(text)
+
+async def compileOne(item, executor, semaphore, outputs, optimize, write):
+    """
+    Compiles one item of compile_many, once the semaphore lets it start
+    Returns (name, error, compiled)
+    """
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        if isinstance(item, tuple):
+            name, source = item
+            file_path = None
+        else:
+            name = file_path = item
+            try:
+                source = await loop.run_in_executor(None, readSource, file_path)
+            except OSError as e:
+                return name, f"{type(e).__name__}: {e}", None
+
+        error, compiled = await loop.run_in_executor(executor, tryCompileSource, source, outputs, optimize)
+        if error is None and write and file_path is not None:
+            try:
+                await loop.run_in_executor(None, writeOutputs, file_path, compiled)
+            except OSError as e:
+                return name, f"{type(e).__name__}: {e}", compiled
+        return name, error, compiled
+
+async def compile_many(items, executor = None, limit = DEFAULT_LIMIT, outputs = ('xml', 'vm'), optimize = False,
+                       write = True):
+    """
+    Compiles items concurrently, yielding (name, error, compiled) for each one as it finishes
+    - items: paths of .jack files, or (name, source) tuples for sources that aren't on disk
+    - executor: where compileSource runs, defaults to the loop's default executor
+    - limit (int): how many items may be compiling at once
+    - outputs: which of 'tokens', 'xml' and 'vm' to produce, as for compileSource
+    - write (bool): whether to write the outputs of paths next to them, as compileFile does
+    error is a message or None on success, and compiled is the dict from compileSource
+    """
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [asyncio.ensure_future(compileOne(item, executor, semaphore, tuple(outputs), optimize, write))
+             for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        #If the caller stops early, don't leave compiles running behind it
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,55 @@
+"""
+bench_binary.py
+
+Compares ways for a downstream tool to get a parse tree: compiling the source again, parsing the .xml output
+with xml.etree, and loading the binary format from jack_bin. Uses the workloads from corpus.py.
+Run from the repository root: python bench/bench_binary.py [scale]
+"""
+
+import gc
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import jack_bin
+from compiler import Compiler
+
+REPEATS = 3
+
+
+def best(function):
+    """Returns the shortest time of REPEATS calls to function, with the garbage collector paused as timeit does"""
+    elapsed = float('inf')
+    gc.disable()
+    try:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            function()
+            elapsed = min(elapsed, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return elapsed
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    print(f"{'workload':<12} {'xml bytes':>10} {'jbin bytes':>10} {'compile s':>10} {'etree s':>9} {'jbin s':>9} {'speedup':>8}")
+    for workload in corpus.WORKLOADS:
+        sources = [source for name, source in corpus.generate(workload, scale)]
+        trees = [Compiler(source).compileClass() for source in sources]
+        texts = [tree.display() for tree in trees]
+        encoded = [jack_bin.encode(tree) for tree in trees]
+
+        compile_time = best(lambda: [Compiler(source).compileClass() for source in sources])
+        etree_time = best(lambda: [ElementTree.fromstring(text) for text in texts])
+        load_time = best(lambda: [jack_bin.decode(data) for data in encoded])
+        print(f"{workload:<12} {sum(map(len, texts)):>10} {sum(map(len, encoded)):>10} {compile_time:>10.3f} "
+              f"{etree_time:>9.3f} {load_time:>9.3f} {compile_time / load_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
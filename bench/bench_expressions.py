@@ -0,0 +1,49 @@
+"""
+bench_expressions.py
+
+Stress test for long and deeply nested expressions: parses, generates VM code for and displays a class
+with one expression of each shape, at 10k operators each. None of the stages may recurse per operator.
+Run from the repository root: python bench/bench_expressions.py [operators]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_generator import CodeGenerator
+from compiler import Compiler
+
+SHAPES = {
+    'chain': lambda n: ' + '.join(['x'] * (n + 1)),
+    'nested': lambda n: '(' * n + 'x' + ' + 1)' * n,
+    'unary': lambda n: '-' * n + 'x',
+    'calls': lambda n: 'Math.max(' * n + 'x' + ', 1)' * n,
+    'arrays': lambda n: 'a[' * n + 'x' + ']' * n,
+}
+
+
+def generate(expression):
+    return f"class Stress {{ function int run(int x, Array a) {{ return {expression}; }} }}"
+
+
+def main():
+    operators = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    print(f"{'shape':<8} {'parse s':>9} {'codegen s':>10} {'display s':>10} {'vm commands':>12}")
+    for shape, build in SHAPES.items():
+        source = generate(build(operators))
+
+        start = time.perf_counter()
+        tree = Compiler(source).compileClass()
+        parsed = time.perf_counter()
+        writer = CodeGenerator().compileClass(tree)
+        generated = time.perf_counter()
+        tree.display()
+        displayed = time.perf_counter()
+
+        print(f"{shape:<8} {parsed - start:>9.3f} {generated - parsed:>10.3f} {displayed - generated:>10.3f} {len(writer.commands):>12}")
+
+
+if __name__ == "__main__":
+    main()
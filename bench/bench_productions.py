@@ -0,0 +1,69 @@
+"""
+bench_productions.py
+
+Counts calls and time for each Compiler production and token helper while parsing a generated class,
+and reports the parser's overall cost per token.
+Run from the repository root: python bench/bench_productions.py [size in bytes]
+Or to parse the classes of a workload from corpus.py, such as the statement heavy huge workload:
+python bench/bench_productions.py --workload huge [--scale N]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+from bench_tokenizer import generate
+from compiler import Compiler
+from profiler import Profiler
+from tokenizer import Tokenizer
+
+PREFIXES = ('compile', 'expect', 'check')
+REPEATS = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Time each production of the parser")
+    parser.add_argument("size", nargs = "?", type = int, default = 1_000_000, help = "Size in bytes of the generated class")
+    parser.add_argument("--workload", choices = sorted(corpus.WORKLOADS), help = "Parse this workload from corpus.py instead")
+    parser.add_argument("--scale", type = int, default = 1, help = "Scale of the workload")
+    args = parser.parse_args()
+    if args.workload:
+        sources = [source for name, source in corpus.generate(args.workload, args.scale)]
+    else:
+        sources = [generate(args.size)]
+    token_count = sum(len(Tokenizer(source).tokenize(source)) for source in sources)
+
+    #Tokenize up front, so that scanning time isn't counted against the productions that peek at tokens.
+    #Best of REPEATS with the garbage collector paused, as timeit does
+    elapsed = float('inf')
+    gc.disable()
+    for _ in range(REPEATS):
+        compilers = [Compiler(source, lazy = False) for source in sources]
+        start = time.perf_counter()
+        for compiler in compilers:
+            compiler.compileClass()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    gc.enable()
+    print(f"{token_count} tokens parsed in {elapsed:.3f}s, {elapsed / token_count * 1e9:.0f} ns/token\n")
+
+    profiler = Profiler()
+    for index, source in enumerate(sources):
+        profiler.startFile(f"source {index}")
+        compiler = Compiler(source, lazy = False)
+        profiler.instrument(compiler, prefixes = PREFIXES)
+        compiler.compileClass()
+    stats = profiler.productions
+
+    print(f"{'production':<24} {'calls':>9} {'total s':>9} {'own s':>9} {'own ns/call':>12}")
+    for name, entry in sorted(stats.items(), key = lambda item: -item[1].own):
+        if entry.calls:
+            print(f"{name:<24} {entry.calls:>9} {entry.total:>9.3f} {entry.own:>9.3f} {entry.own / entry.calls * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+bench_tokenizer.py
+
+Times Tokenizer.tokenize on generated sources from 1 KB to 10 MB, to check that the scanner scales linearly.
+Run from the repository root: python bench/bench_tokenizer.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tokenizer
+
+METHOD = '''
+    method int step%d(int x, Array a) {
+        var String s;
+        let s = "step %d";
+        let a[x] = Foo.bar(x + %d, a[x - 1]) & ~x;
+        if (x < 10) { return x * 2; }
+        return step%d(x / 2, a);
+    }
+'''
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def generate(size):
+    """Returns a single Jack class of at least size characters"""
+    parts = ["class Bench {\n"]
+    length = len(parts[0])
+    i = 0
+    while length < size:
+        method = METHOD % (i, i, i, i)
+        parts.append(method)
+        length += len(method)
+        i += 1
+    parts.append("}\n")
+    return "".join(parts)
+
+
+def main():
+    print(f"{'bytes':>10} {'tokens':>9} {'seconds':>9} {'ns/byte':>8}")
+    for size in SIZES:
+        source = generate(size)
+        scanner = tokenizer.Tokenizer(source)
+        start = time.perf_counter()
+        tokens = scanner.tokenize(source)
+        elapsed = time.perf_counter() - start
+        print(f"{len(source):>10} {len(tokens):>9} {elapsed:>9.4f} {elapsed / len(source) * 1e9:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+corpus.py
+
+Generates synthetic Jack classes for the benchmarks. The same seed and scale always give the same sources,
+so timings from different runs are of the same input. Every generated class compiles all the way to VM code.
+
+Workloads, each a list of (class name, source):
+- small: many small classes, as in a directory of student submissions
+- huge: one very large class
+- nested: statements and expressions nested deeply
+- expressions: long chains of operators
+- strings: many string literals
+"""
+
+import random
+
+VARIABLES = ('x', 'y', 'z')
+OPS = ('+', '-', '*', '/', '&', '|', '<', '>', '=')
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'score', 'total', 'Hello', 'world', '42', 'x = y + 1;', '{ }')
+
+
+class Generator:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def term(self, depth):
+        """Returns a random term, with subexpressions nested at most depth deep"""
+        choice = self.random.randrange(7 if depth > 0 else 3)
+        if choice == 0:
+            return str(self.random.randrange(32768))
+        elif choice == 1 or choice == 2:
+            return self.random.choice(VARIABLES)
+        elif choice == 3:
+            return f"({self.expression(depth - 1)})"
+        elif choice == 4:
+            return self.random.choice('-~') + self.term(depth - 1)
+        elif choice == 5:
+            return f"a[{self.expression(depth - 1)}]"
+        return f"Math.max({self.expression(depth - 1)}, {self.expression(depth - 1)})"
+
+    def expression(self, depth, length = None):
+        """Returns a random expression of length terms, 1 to 3 if not given"""
+        length = length or self.random.randint(1, 3)
+        parts = [self.term(depth)]
+        for _ in range(length - 1):
+            parts.append(self.random.choice(OPS))
+            parts.append(self.term(depth))
+        return ' '.join(parts)
+
+    def string(self):
+        return '"' + ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(1, 6))) + '"'
+
+    def statement(self, depth, indent):
+        """Returns a random statement, with blocks nested at most depth deep"""
+        choice = self.random.randrange(6 if depth > 0 else 4)
+        if choice == 0:
+            return f"{indent}let {self.random.choice(VARIABLES)} = {self.expression(2)};\n"
+        elif choice == 1:
+            return f"{indent}let a[{self.expression(1)}] = {self.expression(2)};\n"
+        elif choice == 2:
+            return f"{indent}do Output.printInt({self.expression(2)});\n"
+        elif choice == 3:
+            return f"{indent}let s = {self.string()};\n"
+        elif choice == 4:
+            return (f"{indent}if ({self.expression(1)}) {{\n{self.statements(depth - 1, indent + '    ')}{indent}}}"
+                    f" else {{\n{self.statements(depth - 1, indent + '    ')}{indent}}}\n")
+        return f"{indent}while ({self.expression(1)}) {{\n{self.statements(depth - 1, indent + '    ')}{indent}}}\n"
+
+    def statements(self, depth, indent, count = None):
+        count = count or self.random.randint(1, 4)
+        return ''.join(self.statement(depth, indent) for _ in range(count))
+
+    def subroutine(self, name, body):
+        return (f"    function int {name}(int x, Array a) {{\n"
+                f"        var int y, z;\n"
+                f"        var String s;\n"
+                f"{body}"
+                f"        return x;\n"
+                f"    }}\n\n")
+
+    def jackClass(self, name, subroutines):
+        """Returns the source of a class made of subroutines, each given as a body"""
+        methods = ''.join(self.subroutine(f"run{i}", body) for i, body in enumerate(subroutines))
+        return f"// Generated by bench/corpus.py\nclass {name} {{\n    static int count;\n\n{methods}}}\n"
+
+
+def small(generator, scale):
+    return [(f"Small{i}", generator.jackClass(f"Small{i}", [generator.statements(2, '        ', 6) for _ in range(3)]))
+            for i in range(100 * scale)]
+
+
+def huge(generator, scale):
+    return [('Huge', generator.jackClass('Huge', [generator.statements(2, '        ', 8) for _ in range(250 * scale)]))]
+
+
+def nested(generator, scale):
+    subroutines = []
+    for _ in range(10 * scale):
+        #Alternating ifs and whiles, around a deeply parenthesised expression
+        depth = 60
+        body = f"let x = {'(' * 200}x{' + 1)' * 200};\n"
+        for level in range(depth):
+            keyword = 'while' if level % 2 else 'if'
+            body = f"{keyword} ({generator.expression(1)}) {{\n{body}}}\n"
+        subroutines.append(body)
+    return [('Nested', generator.jackClass('Nested', subroutines))]
+
+
+def expressions(generator, scale):
+    subroutines = [f"let x = {generator.expression(1, 2000)};\n" for _ in range(20 * scale)]
+    return [('Expressions', generator.jackClass('Expressions', subroutines))]
+
+
+def strings(generator, scale):
+    subroutines = [''.join(f"let s = {generator.string()};\n" for _ in range(200)) for _ in range(20 * scale)]
+    return [('Strings', generator.jackClass('Strings', subroutines))]
+
+
+WORKLOADS = {
+    'small': small,
+    'huge': huge,
+    'nested': nested,
+    'expressions': expressions,
+    'strings': strings,
+}
+
+
+def generate(workload, scale = 1, seed = 0):
+    """Returns the classes of workload as a list of (class name, source)"""
+    return WORKLOADS[workload](Generator(seed), scale)
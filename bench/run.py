@@ -0,0 +1,158 @@
+"""
+run.py
+
+Times each stage of the compiler on every workload from corpus.py: Tokenizer.tokenize, Compiler.compileClass,
+XML.display, and compileFile end to end. Each time is the best of several runs with the garbage collector paused.
+
+Results can be saved as a JSON baseline, and a later run compared against it, failing if any stage got slower by
+more than the threshold.
+Run from the repository root:
+    python bench/run.py --save baseline.json
+    python bench/run.py --compare baseline.json [--threshold 0.1]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+from analyzer import compileFile
+from compiler import Compiler
+from tokenizer import Tokenizer
+
+STAGES = ('tokenize', 'compileClass', 'display', 'compileFile')
+
+
+def best(function, repeats):
+    """Returns the shortest time of repeats calls to function"""
+    elapsed = float('inf')
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            elapsed = min(elapsed, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return elapsed
+
+
+def benchWorkload(classes, directory, repeats):
+    """Returns the time of each stage for classes, a list of (class name, source), in seconds"""
+    sources = [source for name, source in classes]
+
+    def tokenize():
+        for source in sources:
+            Tokenizer(source).tokenize(source)
+
+    def parse():
+        #Tokenized up front, so that this times the parser alone
+        compilers = [Compiler(source, lazy = False) for source in sources]
+        start = time.perf_counter()
+        for compiler in compilers:
+            compiler.compileClass()
+        return time.perf_counter() - start
+
+    trees = [Compiler(source).compileClass() for source in sources]
+    def display():
+        for tree in trees:
+            tree.display()
+
+    paths = []
+    for name, source in classes:
+        paths.append(os.path.join(directory, f"{name}.jack"))
+        with open(paths[-1], 'w') as o:
+            o.write(source)
+    def compileFiles():
+        for path in paths:
+            compileFile(path)
+
+    gc.disable()
+    try:
+        parse_time = min(parse() for _ in range(repeats))
+    finally:
+        gc.enable()
+    return {
+        'tokenize': best(tokenize, repeats),
+        'compileClass': parse_time,
+        'display': best(display, repeats),
+        'compileFile': best(compileFiles, repeats),
+    }
+
+
+def runAll(scale, seed, repeats, workloads):
+    """Returns {'bytes': {workload: size}, 'seconds': {workload: {stage: seconds}}} for each workload"""
+    results = {'scale': scale, 'seed': seed, 'bytes': {}, 'seconds': {}}
+    for workload in workloads:
+        classes = corpus.generate(workload, scale, seed)
+        with tempfile.TemporaryDirectory() as directory:
+            results['bytes'][workload] = sum(len(source) for name, source in classes)
+            results['seconds'][workload] = benchWorkload(classes, directory, repeats)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints how each time compares to the baseline, flagging those more than threshold (a fraction) slower
+    Returns the number of regressions
+    """
+    regressions = 0
+    print(f"{'workload':<12} {'stage':<13} {'baseline s':>11} {'now s':>9} {'change':>8}")
+    for workload, stages in results['seconds'].items():
+        for stage, seconds in stages.items():
+            before = baseline['seconds'].get(workload, {}).get(stage)
+            if before is None:
+                continue
+            change = seconds / before - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"{workload:<12} {stage:<13} {before:>11.4f} {seconds:>9.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def printResults(results):
+    print(f"{'workload':<12} {'bytes':>10} " + ' '.join(f"{stage + ' s':>14}" for stage in STAGES))
+    for workload, stages in results['seconds'].items():
+        print(f"{workload:<12} {results['bytes'][workload]:>10} " + ' '.join(f"{stages[stage]:>14.4f}" for stage in STAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiler on a synthetic corpus")
+    parser.add_argument('--scale', help='Multiplies the size of every workload. Defaults to 1.', type=int, default=1)
+    parser.add_argument('--seed', help='Seed for the corpus generator. Defaults to 0.', type=int, default=0)
+    parser.add_argument('--repeats', help='Runs of each stage to take the best of. Defaults to 5.', type=int, default=5)
+    parser.add_argument('--workload', help='Only run this workload. May be given more than once.', action='append', choices=corpus.WORKLOADS)
+    parser.add_argument('--save', help='Write the results to this JSON file, as a baseline.', type=str, metavar='PATH')
+    parser.add_argument('--compare', help='Compare against a baseline saved with --save.', type=str, metavar='PATH')
+    parser.add_argument('--threshold', help='Slowdown that counts as a regression, as a fraction. Defaults to 0.1.', type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = runAll(args.scale, args.seed, args.repeats, args.workload or list(corpus.WORKLOADS))
+    if args.save:
+        with open(args.save, 'w') as o:
+            json.dump(results, o, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline['scale'], baseline['seed']) != (args.scale, args.seed):
+            print(f"Baseline was run with scale {baseline['scale']} and seed {baseline['seed']}, so its times aren't comparable")
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    printResults(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
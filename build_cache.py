@@ -0,0 +1,90 @@
+"""
+build_cache.py
+
+An on-disk cache of compiler outputs, so that unchanged .jack files don't need to be compiled again.
+Entries are keyed by a hash of the source together with the compiler version, and the least recently used
+entries are evicted once the cache grows past its size limit.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from compiler import VERSION
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def defaultCacheDir():
+    """Returns the cache directory to use when none is given, following the XDG convention"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'jack-compiler')
+
+class BuildCache:
+    def __init__(self, directory = None, max_bytes = DEFAULT_MAX_BYTES):
+        """
+        - directory (str): where cached outputs are stored, created if needed
+        - max_bytes (int): the size evict() shrinks the cache down to
+        """
+        self.directory = directory or defaultCacheDir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok = True)
+
+    def key(self, source, options = ''):
+        """
+        Returns the cache key for source (bytes)
+        options should describe any setting that changes the output for the same source
+        """
+        digest = hashlib.sha256(f"{VERSION}\0{options}\0".encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def entryPath(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def fetch(self, key, out_paths):
+        """
+        Copies the cached outputs for key to out_paths, a dict from suffix (e.g. '.xml') to destination
+        Returns False, copying nothing, unless every suffix is cached
+        """
+        entries = {suffix: self.entryPath(key, suffix) for suffix in out_paths}
+        if not all(os.path.exists(entry) for entry in entries.values()):
+            return False
+        try:
+            for suffix, entry in entries.items():
+                shutil.copyfile(entry, out_paths[suffix])
+                #Mark as recently used, for eviction
+                os.utime(entry)
+        except FileNotFoundError:
+            #Evicted by another process in the meantime
+            return False
+        return True
+
+    def store(self, key, out_paths):
+        """Copies freshly compiled outputs into the cache, out_paths is as in fetch"""
+        for suffix, out_path in out_paths.items():
+            #Write to a temporary file then rename, so parallel workers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+            os.close(fd)
+            shutil.copyfile(out_path, tmp_path)
+            os.replace(tmp_path, self.entryPath(key, suffix))
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache is no larger than max_bytes"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
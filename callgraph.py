@@ -0,0 +1,111 @@
+"""
+callgraph.py
+
+A project-wide pass over the parse trees of every class in a program. It indexes each class's subroutines, builds
+the call graph from the calls in do statements and terms, and finds the subroutines that can run starting from
+the entry points, so that code generation can leave out the rest. The VM starts at Sys.init when the program has
+one, as it does when it bundles its own copy of the OS, and at Main.main otherwise.
+
+Calls are resolved the way CodeGenerator resolves them: f() is a subroutine of the calling class, v.f() one of the
+class v is declared as, and C.f() one of class C. Calls to classes outside the project, like the OS, are ignored.
+CodeGenerator also emits calls that aren't in the tree, which are added as well: Memory.alloc in constructors,
+Math.multiply and Math.divide for * and /, and String.new and String.appendChar for string constants.
+"""
+
+from jack_xml import (IDENTIFIER, STRING_CONSTANT, CLASS_VAR_DEC, SUBROUTINE_DEC, PARAMETER_LIST, VAR_DEC,
+                      SYMBOL, DO_STATEMENT, TERM)
+from code_generator import OS_CALLS
+
+ENTRY_POINTS = ('Sys.init', 'Main.main')
+
+class CallGraph:
+    def __init__(self):
+        self.subroutines = {} #Full name, e.g. 'Main.main', to its subroutineDec node
+        self.calls = {} #Full name of each subroutine to the set of full names it calls within the project
+        self.class_names = set()
+        self.pending = [] #(class name, field types, subroutineDec) for the subroutines still to be scanned
+
+    def addClass(self, classXML):
+        '''
+        Indexes the subroutines of a parse tree from Compiler.compileClass
+        Their calls are resolved once every class has been added, as they may refer to classes added later
+        '''
+        class_name = classXML.children[1].text
+        self.class_names.add(class_name)
+        field_types = {}
+        for child in classXML.children:
+            if child.tag_id == CLASS_VAR_DEC:
+                declareNames(field_types, child.children[1].text, child.children[2:])
+            elif child.tag_id == SUBROUTINE_DEC:
+                self.subroutines[f"{class_name}.{child.children[2].text}"] = child
+                self.pending.append((class_name, field_types, child))
+
+    def resolve(self):
+        '''Builds the call graph for every class added so far'''
+        for class_name, field_types, subroutineXML in self.pending:
+            name = f"{class_name}.{subroutineXML.children[2].text}"
+            self.calls[name] = self.callsIn(class_name, field_types, subroutineXML)
+        self.pending = []
+
+    def callsIn(self, class_name, field_types, subroutineXML):
+        '''Returns the set of project subroutines called from a subroutineDec'''
+        types = dict(field_types)
+        for child in subroutineXML.children:
+            if child.tag_id == PARAMETER_LIST:
+                names = [node.text for node in child.children if node.tag_id != SYMBOL]
+                for i in range(0, len(names), 2):
+                    types[names[i + 1]] = names[i]
+        body = subroutineXML.children[-1]
+        for child in body.children:
+            if child.tag_id == VAR_DEC:
+                declareNames(types, child.children[1].text, child.children[2:])
+
+        targets = set()
+        if subroutineXML.children[0].text == 'constructor':
+            targets.add('Memory.alloc')
+        pending = [body]
+        while pending:
+            node = pending.pop()
+            children = node.children
+            if node.tag_id == DO_STATEMENT:
+                targets.add(self.callTarget(class_name, types, children[1:]))
+            elif node.tag_id == TERM and len(children) > 1 and children[0].tag_id == IDENTIFIER and children[1].text in ('(', '.'):
+                targets.add(self.callTarget(class_name, types, children))
+            elif node.tag_id == SYMBOL and node.text in OS_CALLS:
+                #* and / are only ever binary operators, which CodeGenerator compiles to calls
+                targets.add(OS_CALLS[node.text])
+            elif node.tag_id == STRING_CONSTANT:
+                targets.add('String.new')
+                if node.text:
+                    targets.add('String.appendChar')
+            pending.extend(children)
+        return {target for target in targets if target in self.subroutines}
+
+    def callTarget(self, class_name, types, nodes):
+        '''
+        Returns the full name of the subroutine a call refers to
+        Grammar: subroutineName '(' expressionList ')' | (className | varName) '.' subroutineName '(' expressionList ')'
+        '''
+        if nodes[1].text == '(':
+            return f"{class_name}.{nodes[0].text}"
+        receiver = nodes[0].text
+        return f"{types.get(receiver, receiver)}.{nodes[2].text}"
+
+    def reachable(self, roots = ENTRY_POINTS):
+        '''Returns the set of full names of the subroutines that can be called, directly or not, from roots'''
+        if self.pending:
+            self.resolve()
+        seen = {root for root in roots if root in self.subroutines}
+        pending = list(seen)
+        while pending:
+            for callee in self.calls[pending.pop()]:
+                if callee not in seen:
+                    seen.add(callee)
+                    pending.append(callee)
+        return seen
+
+def declareNames(types, type, nodes):
+    '''Records type for each variable name among nodes, the rest of a declaration after its type'''
+    for node in nodes:
+        if node.tag_id == IDENTIFIER:
+            types[node.text] = type
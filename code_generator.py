@@ -0,0 +1,311 @@
+"""
+code_generator.py
+
+Generates VM code from the parse tree that Compiler.compileClass produces.
+"""
+
+from jack_xml import (KEYWORD, SYMBOL, IDENTIFIER, INTEGER_CONSTANT, STRING_CONSTANT,
+                      CLASS_VAR_DEC, SUBROUTINE_DEC, PARAMETER_LIST, VAR_DEC, STATEMENTS,
+                      LET_STATEMENT, IF_STATEMENT, WHILE_STATEMENT, DO_STATEMENT, RETURN_STATEMENT,
+                      EXPRESSION, EXPRESSION_LIST)
+from compiler import CompileError
+from symbol_table import SymbolTable
+from vm_writer import VMWriter
+
+#Binary operators, as VM arithmetic commands or as OS calls for the ones the VM doesn't have
+ARITHMETIC = {'+': 'add', '-': 'sub', '&': 'and', '|': 'or', '<': 'lt', '>': 'gt', '=': 'eq'}
+OS_CALLS = {'*': 'Math.multiply', '/': 'Math.divide'}
+UNARY = {'-': 'neg', '~': 'not'}
+
+MAX_CONSTANT = 32767
+
+class CodeGenerator:
+    def __init__(self, writer = None):
+        self.writer = writer or VMWriter()
+        self.symbols = SymbolTable()
+        self.class_name = None
+        self.subroutine_name = None
+        self.label_count = 0
+
+        self.statement_handlers = {
+            LET_STATEMENT: self.compileLet,
+            IF_STATEMENT: self.compileIf,
+            WHILE_STATEMENT: self.compileWhile,
+            DO_STATEMENT: self.compileDo,
+            RETURN_STATEMENT: self.compileReturn,
+        }
+
+    def compileClass(self, classXML, keep = None):
+        '''
+        Generates the code for a class node, and returns the VMWriter holding it
+        keep - if given, the set of full subroutine names (e.g. 'Main.main') to generate, leaving out the rest
+        Grammar: 'class' className '{' classVarDec* subroutineDec* '}'
+        '''
+        self.class_name = classXML.children[1].text
+        for child in classXML.children:
+            if child.tag_id == CLASS_VAR_DEC:
+                self.compileVarDec(child, kind = child.children[0].text)
+            elif child.tag_id == SUBROUTINE_DEC:
+                if keep is None or f"{self.class_name}.{child.children[2].text}" in keep:
+                    self.compileSubroutine(child)
+        return self.writer
+
+    def compileVarDec(self, decXML, kind):
+        '''
+        Defines the variables of a classVarDec or varDec node
+        Grammar: ('static' | 'field' | 'var') type varName (',' varName)* ';'
+        '''
+        type = decXML.children[1].text
+        for child in decXML.children[2:]:
+            if child.tag_id == IDENTIFIER:
+                self.symbols.define(child.text, type, kind)
+
+    def compileParameterList(self, parameterListXML):
+        '''
+        Defines the arguments of a parameterList node
+        Grammar: (type varName (',' type varName)*)?
+        '''
+        names = [child.text for child in parameterListXML.children if child.tag_id != SYMBOL]
+        for i in range(0, len(names), 2):
+            self.symbols.define(names[i + 1], names[i], 'arg')
+
+    def compileSubroutine(self, subroutineXML):
+        '''
+        Grammar: ('constructor'|'function'|'method') ('void'|type) subroutineName '(' parameterList ')' subroutineBody
+        '''
+        children = subroutineXML.children
+        kind = children[0].text
+        self.subroutine_name = children[2].text
+        self.symbols.startSubroutine()
+        self.label_count = 0
+
+        if kind == 'method':
+            #The object is passed as a hidden first argument
+            self.symbols.define('this', self.class_name, 'arg')
+        for child in children:
+            if child.tag_id == PARAMETER_LIST:
+                self.compileParameterList(child)
+
+        body = children[-1].children
+        for child in body:
+            if child.tag_id == VAR_DEC:
+                self.compileVarDec(child, kind = 'var')
+
+        self.writer.writeFunction(f"{self.class_name}.{self.subroutine_name}", self.symbols.varCount('var'))
+        if kind == 'constructor':
+            self.writer.writePush('constant', self.symbols.varCount('field'))
+            self.writer.writeCall('Memory.alloc', 1)
+            self.writer.writePop('pointer', 0)
+        elif kind == 'method':
+            self.writer.writePush('argument', 0)
+            self.writer.writePop('pointer', 0)
+
+        for child in body:
+            if child.tag_id == STATEMENTS:
+                self.compileStatements(child)
+
+    def compileStatements(self, statementsXML):
+        for statement in statementsXML.children:
+            self.statement_handlers[statement.tag_id](statement)
+
+    def compileLet(self, letXML):
+        '''
+        Grammar: 'let' varName ('[' expression ']')? '=' expression ';'
+        '''
+        children = letXML.children
+        symbol = self.lookup(children[1].text)
+        if children[2].text == '[':
+            #Work out the address first, but only store through it once the value is computed,
+            #since the value could itself use pointer 1
+            self.writer.writePush(symbol.segment, symbol.index)
+            self.compileExpression(children[3])
+            self.writer.writeArithmetic('add')
+            self.compileExpression(children[6])
+            self.writer.writePop('temp', 0)
+            self.writer.writePop('pointer', 1)
+            self.writer.writePush('temp', 0)
+            self.writer.writePop('that', 0)
+        else:
+            self.compileExpression(children[3])
+            self.writer.writePop(symbol.segment, symbol.index)
+
+    def compileIf(self, ifXML):
+        '''
+        Grammar: 'if' '(' expression ')' '{' statements '}' ('else' '{' statements '}')?
+        '''
+        children = ifXML.children
+        false_label, end_label = self.newLabels('IF_FALSE', 'IF_END')
+        self.compileExpression(children[2])
+        self.writer.writeArithmetic('not')
+        self.writer.writeIf(false_label)
+        self.compileStatements(children[5])
+        if len(children) > 7:
+            self.writer.writeGoto(end_label)
+            self.writer.writeLabel(false_label)
+            self.compileStatements(children[9])
+            self.writer.writeLabel(end_label)
+        else:
+            self.writer.writeLabel(false_label)
+
+    def compileWhile(self, whileXML):
+        '''
+        Grammar: 'while' '(' expression ')' '{' statements '}'
+        '''
+        children = whileXML.children
+        loop_label, end_label = self.newLabels('WHILE_EXP', 'WHILE_END')
+        self.writer.writeLabel(loop_label)
+        self.compileExpression(children[2])
+        self.writer.writeArithmetic('not')
+        self.writer.writeIf(end_label)
+        self.compileStatements(children[5])
+        self.writer.writeGoto(loop_label)
+        self.writer.writeLabel(end_label)
+
+    def compileDo(self, doXML):
+        '''
+        Grammar: 'do' subroutineCall ';'
+        '''
+        self.generate(self.compileCall(doXML.children[1:-1]))
+        #Throw away the return value
+        self.writer.writePop('temp', 0)
+
+    def compileReturn(self, returnXML):
+        '''
+        Grammar: 'return' expression? ';'
+        '''
+        children = returnXML.children
+        if len(children) > 2:
+            self.compileExpression(children[1])
+        else:
+            #Void subroutines still return a value, which the caller discards
+            self.writer.writePush('constant', 0)
+        self.writer.writeReturn()
+
+    def compileExpression(self, expressionXML):
+        '''
+        Grammar: term (op term)*
+        Jack has no operator precedence, so the operators are applied left to right
+        '''
+        self.generate([expressionXML])
+
+    def generate(self, items):
+        '''
+        Generates the code for items in order. An item is an expression or term node, or a writer call to make
+        once the items before it are done, as a tuple (method, *args)
+
+        Nested terms and expressions go on an explicit stack rather than recursing, so deeply nested
+        expressions can't overflow the Python stack
+        '''
+        work = items[::-1]
+        while work:
+            item = work.pop()
+            if type(item) is tuple:
+                item[0](*item[1:])
+            elif item.tag_id == EXPRESSION:
+                #Pushed in reverse: term0, then term1 op1, term2 op2, ...
+                children = item.children
+                for i in range(len(children) - 2, 0, -2):
+                    work.append(self.operator(children[i].text))
+                    work.append(children[i + 1])
+                work.append(children[0])
+            else:
+                work.extend(reversed(self.compileTerm(item)))
+
+    def operator(self, op):
+        '''Returns the deferred writer call for a binary operator'''
+        if op in ARITHMETIC:
+            return (self.writer.writeArithmetic, ARITHMETIC[op])
+        return (self.writer.writeCall, OS_CALLS[op], 2)
+
+    def compileTerm(self, termXML):
+        '''
+        Writes the code for a term that can be written straight away, and returns the items for generate that
+        still need to follow it
+
+        Grammar: integerConstant | stringConstant | keywordConstant | varName | varName '[' expression ']' |
+                 subroutineCall | '(' expression ')' | unaryOp term
+        '''
+        children = termXML.children
+        first = children[0]
+        tag_id = first.tag_id
+
+        if tag_id == INTEGER_CONSTANT:
+            value = int(first.text)
+            if value > MAX_CONSTANT:
+                raise CompileError(f"Integer constant {value} is too large in {self.class_name}.{self.subroutine_name}")
+            self.writer.writePush('constant', value)
+        elif tag_id == STRING_CONSTANT:
+            self.writer.writePush('constant', len(first.text))
+            self.writer.writeCall('String.new', 1)
+            for char in first.text:
+                self.writer.writePush('constant', ord(char))
+                self.writer.writeCall('String.appendChar', 2)
+        elif tag_id == KEYWORD:
+            if first.text == 'this':
+                self.writer.writePush('pointer', 0)
+            else:
+                self.writer.writePush('constant', 0)
+                if first.text == 'true':
+                    self.writer.writeArithmetic('not')
+        elif tag_id == SYMBOL:
+            if first.text == '(':
+                return [children[1]]
+            return [children[1], (self.writer.writeArithmetic, UNARY[first.text])]
+        elif len(children) == 1:
+            symbol = self.lookup(first.text)
+            self.writer.writePush(symbol.segment, symbol.index)
+        elif children[1].text == '[':
+            symbol = self.lookup(first.text)
+            self.writer.writePush(symbol.segment, symbol.index)
+            return [children[2],
+                    (self.writer.writeArithmetic, 'add'),
+                    (self.writer.writePop, 'pointer', 1),
+                    (self.writer.writePush, 'that', 0)]
+        else:
+            return self.compileCall(children)
+        return []
+
+    def compileCall(self, nodes):
+        '''
+        Writes the start of a subroutine call, and returns the items for generate that complete it
+        Grammar: subroutineName '(' expressionList ')' | (className | varName) '.' subroutineName '(' expressionList ')'
+        '''
+        names = [node.text for node in nodes if node.tag_id == IDENTIFIER]
+        expressions = [node for node in nodes if node.tag_id == EXPRESSION_LIST][0].children
+        n_args = (len(expressions) + 1) // 2
+
+        if len(names) == 1:
+            #A method of this class, called on this object
+            self.writer.writePush('pointer', 0)
+            name = f"{self.class_name}.{names[0]}"
+            n_args += 1
+        elif len(names) == 2:
+            symbol = self.symbols.lookup(names[0])
+            if symbol:
+                #A method called on an object in a variable
+                self.writer.writePush(symbol.segment, symbol.index)
+                name = f"{symbol.type}.{names[1]}"
+                n_args += 1
+            else:
+                #A function or constructor of a class
+                name = f"{names[0]}.{names[1]}"
+        else:
+            raise CompileError(f"Invalid subroutine call {'.'.join(names)} in {self.class_name}.{self.subroutine_name}")
+
+        items = [expression for expression in expressions if expression.tag_id != SYMBOL]
+        items.append((self.writer.writeCall, name, n_args))
+        return items
+
+    def lookup(self, name):
+        symbol = self.symbols.lookup(name)
+        if symbol is None:
+            raise CompileError(f"Undefined variable {name} in {self.class_name}.{self.subroutine_name}")
+        return symbol
+
+    def newLabels(self, *prefixes):
+        '''
+        Returns a label for each prefix, numbered so they are unique within the subroutine
+        '''
+        labels = [f"{prefix}{self.label_count}" for prefix in prefixes]
+        self.label_count += 1
+        return labels
@@ -0,0 +1,143 @@
+"""
+compile_server.py
+
+A long-running compile server, so that editors and graders don't pay for interpreter startup and imports on every
+file. It listens on a Unix socket, and each connection sends requests as lines of JSON, getting a line of JSON back
+for each one.
+
+Request:  {"path": "Main.jack"} or {"source": "class Main { ... }"}, with optional "outputs", a list of any of
+          "tokens", "xml" and "vm" (defaults to ["xml", "vm"]), and "optimize" (defaults to false)
+Response: {"ok": true, "xml": "...", "vm": "..."}
+          or {"ok": false, "error": "...", "line": 3, "column": 7}, where line and column may be null
+"""
+
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from analyzer import compileSource
+from compiler import CompileError
+
+OUTPUTS = frozenset(('tokens', 'xml', 'vm'))
+DEFAULT_CACHE_ENTRIES = 256
+
+class ParseCache:
+    def __init__(self, max_entries = DEFAULT_CACHE_ENTRIES):
+        """
+        Keeps the outputs of recently compiled sources in memory, dropping the least recently used past max_entries
+        Shared by the server's request threads, so access is locked
+        """
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            compiled = self.entries.get(key)
+            if compiled is not None:
+                self.entries.move_to_end(key)
+            return compiled
+
+    def put(self, key, compiled):
+        with self.lock:
+            self.entries[key] = compiled
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+
+class CompileServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache_entries = DEFAULT_CACHE_ENTRIES):
+        self.cache = ParseCache(cache_entries)
+        super().__init__(socket_path, CompileRequestHandler)
+
+    def respond(self, request):
+        """Compiles the source for one request dict, and returns the response dict"""
+        outputs = request.get('outputs', ['xml', 'vm'])
+        #Checked as strings first, as anything unhashable, like a nested list, can't be looked up in OUTPUTS
+        if not isinstance(outputs, list) or not all(isinstance(output, str) and output in OUTPUTS for output in outputs):
+            return errorResponse(f"outputs must be a list of {sorted(OUTPUTS)}")
+        optimize = bool(request.get('optimize', False))
+
+        try:
+            if 'source' in request:
+                source = request['source']
+            elif 'path' in request:
+                with open(request['path'], 'r') as f:
+                    source = f.read()
+            else:
+                return errorResponse('A request needs either a "path" or a "source"')
+
+            key = hashlib.sha256(source.encode()).hexdigest() + repr((sorted(outputs), optimize))
+            compiled = self.cache.get(key)
+            if compiled is None:
+                compiled = compileSource(source, outputs, optimize)
+                self.cache.put(key, compiled)
+        except CompileError as e:
+            return errorResponse(e.message, e.line, e.column)
+        except Exception as e:
+            #Keep serving whatever a single request does
+            return errorResponse(f"{type(e).__name__}: {e}")
+
+        return {'ok': True, **compiled}
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = errorResponse(f"Invalid JSON: {e}")
+            else:
+                if isinstance(request, dict):
+                    response = self.server.respond(request)
+                else:
+                    response = errorResponse("A request must be a JSON object")
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+def errorResponse(message, line = None, column = None):
+    return {'ok': False, 'error': message, 'line': line, 'column': column}
+
+def removeStaleSocket(socket_path):
+    """
+    Removes a socket file left behind by a server that didn't shut down cleanly
+    Raises OSError if a server is still listening on it
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise OSError(f"A server is already listening on {socket_path}")
+
+def serve(socket_path, cache_entries = DEFAULT_CACHE_ENTRIES):
+    """Runs a CompileServer on socket_path until interrupted"""
+    removeStaleSocket(socket_path)
+    with CompileServer(socket_path, cache_entries) as server:
+        print(f"Listening on {socket_path}", flush = True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+def request(socket_path, **fields):
+    """
+    Sends a single request to a running server and returns its response
+    e.g. request('/tmp/jack.sock', path = 'Main.jack', outputs = ['vm'])
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(fields).encode() + b'\n')
+        with connection.makefile('rb') as responses:
+            return json.loads(responses.readline())
@@ -1,39 +1,216 @@
 import jack_xml
-from tokenizer import Tokenizer
+from tokenizer import Tokenizer, TokenStream, typeName, IDENTIFIER, INTEGER_CONSTANT, STRING_CONSTANT
+
+KEYWORD_TOKENS = Tokenizer.KEYWORD_TOKENS
+SYMBOL_TOKENS = Tokenizer.SYMBOL_TOKENS
+
+def tokenSet(*contents):
+    '''
+    Returns the frozenset of shared keyword and symbol tokens with the given contents
+    Since those tokens are singletons, membership is a hash on the object rather than string comparisons
+    '''
+    return frozenset(KEYWORD_TOKENS.get(content) or SYMBOL_TOKENS[content] for content in contents)
+
+#Token predicates used by the grammar, built once instead of as a fresh list on every check
+CLASS_VAR_KINDS = tokenSet('static', 'field')
+SUBROUTINE_KINDS = tokenSet('constructor', 'function', 'method')
+PRIMITIVE_TYPES = tokenSet('int', 'char', 'boolean')
+OPS = tokenSet('+', '-', '*', '/', '&', '|', '<', '>', '=')
+UNARY_OPS = tokenSet('-', '~')
+KEYWORD_CONSTANTS = tokenSet('true', 'false', 'null', 'this')
+CONSTANT_TYPES = frozenset((INTEGER_CONSTANT, STRING_CONSTANT))
+STATEMENT_KEYWORDS = tokenSet('let', 'if', 'while', 'do', 'return')
+
+#Where the recovering parser picks up again after an error, for each kind of construct
+CLASS_MEMBER_STOPS = CLASS_VAR_KINDS | SUBROUTINE_KINDS
+VAR_DEC_STOPS = tokenSet('var') | STATEMENT_KEYWORDS
+OPEN_BRACE = SYMBOL_TOKENS['{']
+CLASS_HEADER_STOPS = CLASS_MEMBER_STOPS | {OPEN_BRACE}
+CLOSE_BRACE = SYMBOL_TOKENS['}']
+SEMICOLON = SYMBOL_TOKENS[';']
+
+#The FIRST sets of the grammar as dispatch tables, so each statement and term is chosen with one dict lookup.
+#Statements map to the name of their production, so that overrides and Profiler.instrument still apply
+STATEMENT_PRODUCTIONS = {
+    KEYWORD_TOKENS['let']: 'compileLet',
+    KEYWORD_TOKENS['if']: 'compileIf',
+    KEYWORD_TOKENS['while']: 'compileWhile',
+    KEYWORD_TOKENS['do']: 'compileDo',
+    KEYWORD_TOKENS['return']: 'compileReturn',
+}
+#What a term starts with: keywords and symbols are looked up by their shared token, other tokens by their type code
+UNARY_TERM, NESTED_TERM, NAME_TERM, CONSTANT_TERM = range(4)
+TERM_STARTS = {
+    **dict.fromkeys(UNARY_OPS, UNARY_TERM),
+    SYMBOL_TOKENS['(']: NESTED_TERM,
+    **dict.fromkeys(KEYWORD_CONSTANTS, CONSTANT_TERM),
+    IDENTIFIER: NAME_TERM,
+    INTEGER_CONSTANT: CONSTANT_TERM,
+    STRING_CONSTANT: CONSTANT_TERM,
+}
+OPEN_BRACKET = SYMBOL_TOKENS['[']
+OPEN_PAREN = SYMBOL_TOKENS['(']
+PERIOD = SYMBOL_TOKENS['.']
+
+#Bump whenever the output for a given source changes, so that cached builds are not reused
+VERSION = '2'
+
+def termStart(token):
+    '''Returns what token starts, from TERM_STARTS, or None if it can't start a term'''
+    start = TERM_STARTS.get(token)
+    if start is None and token is not None:
+        start = TERM_STARTS.get(token.kind)
+    return start
 
 class Compiler:
-    def __init__(self, file):
+    def __init__(self, file, lazy = True, recover = False):
+        '''
+        file - the source to compile
+        lazy - if true, tokens are scanned as the parser asks for them, so parsing starts straight away and
+               only the lookahead buffer is held in memory. Otherwise the file is tokenized up front
+        recover - if true, errors don't stop the parse. Each is added to diagnostics, and parsing carries on from
+                  the next declaration or statement, so one pass finds every error. The tree is then incomplete
+        '''
         self.cur_file = file
-        
-        tokenizer = Tokenizer(file)
-        self.tokens = tokenizer.tokenize(file)
-        self.cur_token_index = 0
+        self.recover = recover
+        self.diagnostics = [] #CompileErrors found in recovery mode, including problems found by the tokenizer
+
+        self.tokenizer = Tokenizer(file, report = self.reportProblem if recover else None)
+        if lazy:
+            self.tokens = TokenStream(self.tokenizer.scan(file))
+        else:
+            self.tokens = TokenStream(list(self.tokenizer.scan(file)))
 
     def expect(self, parent, content = None, type = None, allowEither = False):
         '''
         Specifies and checks what the next token contains. Then selects the next token
 
         Keyword arguments:
-        content - A string or list of strings to check against
-        type - A string or list of strings to check against
+        content - A string or collection of strings to check against
+        type - A token type code (e.g. IDENTIFIER) or collection of them to check against
         parent - An XML object. If successful, add the token to the parent as a child
         allowEither - A boolean. If true, allow just one of content and type to match - only applies if both content and type are given
         '''
-        token = self.tokens[self.cur_token_index]
+        token = self.tokens.peek()
+        if token is None:
+            expected = []
+            if type is not None:
+                expected.append(f"type {typeName(type)}")
+            if content is not None:
+                expected.append(f"content {content}")
+            raise self.error(f"Unexpected end of file, expected token with {(' or ' if allowEither else ' and ').join(expected)}" if expected
+                             else "Unexpected end of file")
 
         if allowEither:
-            if content and type and not(token.checkContent(content) or token.checkType(type)):
-                raise CompileError(f"Expected token with either type {type} or content {content}, got type {token.type} and content {token.content}")
+            if content is not None and type is not None and not(token.checkContent(content) or token.checkType(type)):
+                raise self.error(f"Expected token with either type {typeName(type)} or content {content}, got type {token.type} and content {token.content}")
         else:
-            if content and type and not(token.checkContent(content) and token.checkType(type)):
-                raise CompileError(f"Expected token of type {type} with content {content}, got type {token.type} and content {token.content}")
-            if content and not token.checkContent(content):
-                raise CompileError(f"Expected token with content {content}, got type {token.type} and content {token.content}")
-            elif type and not token.checkType(type): 
-                raise CompileError(f"Expected token of type {type}, got type {token.type} and content {token.content}")
+            if content is not None and type is not None and not(token.checkContent(content) and token.checkType(type)):
+                raise self.error(f"Expected token of type {typeName(type)} with content {content}, got type {token.type} and content {token.content}")
+            if content is not None and not token.checkContent(content):
+                raise self.error(f"Expected token with content {content}, got type {token.type} and content {token.content}")
+            elif type is not None and not token.checkType(type): 
+                raise self.error(f"Expected token of type {typeName(type)}, got type {token.type} and content {token.content}")
         
         parent.addChild(token.toXML())
-        self.cur_token_index += 1
+        self.tokens.advance()
+
+    def expectToken(self, parent, expected):
+        '''
+        Fast path for expect with a single keyword or symbol: those tokens are shared, so this is an identity check
+
+        expected - the shared token, e.g. SYMBOL_TOKENS[';']
+        '''
+        token = self.tokens.peek()
+        if token is not expected:
+            raise self.unexpected(f"token with content {expected.content}")
+        parent.addChild(token.toXML())
+        self.tokens.advance()
+
+    def expectSymbol(self, parent, symbol):
+        self.expectToken(parent, SYMBOL_TOKENS[symbol])
+
+    def expectKeyword(self, parent, keyword):
+        self.expectToken(parent, KEYWORD_TOKENS[keyword])
+
+    def expectIn(self, parent, tokens):
+        '''
+        Fast path for expect with a list of contents
+
+        tokens - a frozenset of shared tokens, like OPS
+        '''
+        token = self.tokens.peek()
+        if token not in tokens:
+            raise self.unexpected(f"token with content {sorted(t.content for t in tokens)}")
+        parent.addChild(token.toXML())
+        self.tokens.advance()
+
+    def expectKind(self, parent, kind):
+        '''
+        Fast path for expect with a single type code
+        '''
+        token = self.tokens.peek()
+        if token is None or token.kind != kind:
+            raise self.unexpected(f"token of type {typeName(kind)}")
+        parent.addChild(token.toXML())
+        self.tokens.advance()
+
+    def unexpected(self, expected):
+        '''
+        Returns a CompileError saying the current token isn't what was expected
+        '''
+        token = self.tokens.peek()
+        if token is None:
+            return self.error(f"Unexpected end of file, expected {expected}")
+        return self.error(f"Expected {expected}, got type {token.type} and content {token.content}")
+
+    def error(self, message):
+        '''
+        Returns a CompileError located at the current token
+        '''
+        line, column = self.tokenizer.lineColumn(self.tokens.position())
+        return CompileError(message, line, column)
+
+    def recoverFrom(self, error, stops, semicolon = True):
+        '''
+        In recovery mode, records error and skips ahead to where parsing can carry on. Otherwise raises error
+
+        stops - the shared tokens that can start the next construct, e.g. STATEMENT_KEYWORDS
+        semicolon - whether a ';' also ends the construct, in which case the parse carries on after it
+        '''
+        if not self.recover:
+            raise error
+        #An error that leads straight to another at the same token is only reported once
+        if not self.diagnostics or (self.diagnostics[-1].line, self.diagnostics[-1].column) != (error.line, error.column):
+            self.diagnostics.append(error)
+        self.synchronize(stops, semicolon)
+
+    def synchronize(self, stops, semicolon = True):
+        '''
+        Skips tokens up to the next one in stops, past the next ';' if semicolon is true, or up to the '}' that
+        closes the enclosing block. Blocks in braces are skipped whole, so a statement inside one isn't mistaken
+        for where to carry on
+        '''
+        depth = 0
+        while True:
+            token = self.tokens.peek()
+            if token is None:
+                return
+            elif depth == 0:
+                if token in stops or token is CLOSE_BRACE:
+                    return
+                elif token is SEMICOLON and semicolon:
+                    self.tokens.advance()
+                    return
+            if token is OPEN_BRACE:
+                depth += 1
+            elif token is CLOSE_BRACE:
+                depth -= 1
+            self.tokens.advance()
+
+    def reportProblem(self, message, line, column):
+        '''Records a problem found by the tokenizer in recovery mode'''
+        self.diagnostics.append(CompileError(message, line, column))
 
     def expectType(self, parent):
         '''
@@ -41,7 +218,11 @@ class Compiler:
         Grammar: 'int'|'char'|'boolean'|className
         Does not check that this is an existing class
         '''
-        return self.expect(content = ['int', 'char', 'boolean'], type = 'identifier', parent = parent, allowEither=True)
+        token = self.tokens.peek()
+        if token not in PRIMITIVE_TYPES and (token is None or token.kind != IDENTIFIER):
+            raise self.unexpected("token with either type identifier or content ['boolean', 'char', 'int']")
+        parent.addChild(token.toXML())
+        self.tokens.advance()
     
     def expectBody(self, parent, begin = None, end = None, interior = None):
         '''
@@ -49,41 +230,77 @@ class Compiler:
         Use, for example, with grammar like '(' body ')' 
         '''
         if begin:
-            self.expect(content = begin, parent = parent)
+            self.expectSymbol(parent, begin)
         if interior:
             parent.addChild(interior())
         if end:
-            self.expect(content = end, parent = parent)
+            self.expectSymbol(parent, end)
 
 
-    def check(self, content = None, type = None):
+    def check(self, content = None, type = None, offset = 0):
         '''
         Check if the next token is of the specified type, returns a boolean
+        offset - how many tokens past the next one to look at, for when one token of lookahead isn't enough
         '''
-        token = self.tokens[self.cur_token_index]
+        token = self.tokens.peek(offset)
+        if token is None:
+            return False
         #print(f"Expecting content = {content} and type = {type}, got content {token.content} and type {token.type}")
-        if content and type:
+        if content is not None and type is not None:
             return token.checkContent(content) and token.checkType(type)
-        elif content:
+        elif content is not None:
             return token.checkContent(content)
-        elif type: 
+        elif type is not None: 
             return token.checkType(type)
 
+    def checkSymbol(self, symbol):
+        '''Fast path for check with a single symbol, as an identity check against the shared token'''
+        return self.tokens.peek() is SYMBOL_TOKENS[symbol]
+
+    def checkKeyword(self, keyword):
+        return self.tokens.peek() is KEYWORD_TOKENS[keyword]
+
+    def checkIn(self, tokens):
+        '''Fast path for check with a list of contents, tokens is a frozenset like OPS'''
+        return self.tokens.peek() in tokens
+
+    def checkKind(self, kind):
+        '''Fast path for check with a single type code'''
+        token = self.tokens.peek()
+        return token is not None and token.kind == kind
+
 
     def compileClass(self):
         '''
         Compiles a class with grammar class NAME { ... }
         '''
         classXML = jack_xml.XML(tag = "class")
-        self.expect(content = 'class', parent= classXML)
-        self.expect(type = 'identifier', parent=classXML)
-        self.expect(content = '{', parent=classXML)
+        try:
+            self.expectKeyword(classXML, 'class')
+            self.expectKind(classXML, IDENTIFIER)
+            self.expectSymbol(classXML, '{')
+        except CompileError as error:
+            #The class's own '{' starts the body rather than a block to skip, so carry on just after it
+            self.recoverFrom(error, CLASS_HEADER_STOPS, semicolon = False)
+            if self.tokens.peek() is OPEN_BRACE:
+                self.tokens.advance()
 
         classXML.addChild(self.compileClassVarDec())
 
         classXML.addChild(self.compileSubroutine())
 
-        self.expect(content = '}', parent = classXML)
+        while True:
+            at_end = self.tokens.peek() is None
+            try:
+                self.expectSymbol(classXML, '}')
+                break
+            except CompileError as error:
+                self.recoverFrom(error, CLASS_MEMBER_STOPS)
+            if at_end:
+                break
+            #Recovery stopped at another member, or just after a stray declaration, so carry on checking from there
+            classXML.addChild(self.compileClassVarDec())
+            classXML.addChild(self.compileSubroutine())
 
         return classXML
 
@@ -94,18 +311,22 @@ class Compiler:
         '''
         classVarDecs = []
 
-        while self.check(content = ["static", "field"]):
+        while self.checkIn(CLASS_VAR_KINDS):
             varDecXML = jack_xml.XML(tag = "classVarDec")
-            self.expect(content = ['static', 'field'], parent = varDecXML)
-            self.expectType(varDecXML)
-            self.expect(type = 'identifier', parent = varDecXML) #varName
+            try:
+                self.expectIn(varDecXML, CLASS_VAR_KINDS)
+                self.expectType(varDecXML)
+                self.expectKind(varDecXML, IDENTIFIER) #varName
 
-            #Check if declaring multiple variables
-            while self.check(content = ','):
-                self.expect(content = ',', parent = varDecXML)
-                self.expect(type = 'identifier', parent = varDecXML) # varName
+                #Check if declaring multiple variables
+                while self.checkSymbol(','):
+                    self.expectSymbol(varDecXML, ',')
+                    self.expectKind(varDecXML, IDENTIFIER) # varName
 
-            self.expect(content= ';', parent=varDecXML)
+                self.expectSymbol(varDecXML, ';')
+            except CompileError as error:
+                self.recoverFrom(error, CLASS_MEMBER_STOPS)
+                continue
 
             classVarDecs.append(varDecXML)
 
@@ -118,24 +339,34 @@ class Compiler:
         '''
         subroutineDecs = []
 
-        while self.check(content = ['constructor', 'function', 'method']):
-            subroutineDecXML = jack_xml.XML(tag = "subroutineDec")
-            self.expect(content = ['constructor', 'function', 'method'], parent = subroutineDecXML)
-
-            #Either a type or void
-            if self.check(content = 'void'):
-                self.expect(content = 'void', parent = subroutineDecXML)
-            else:
-                self.expectType(subroutineDecXML)
-            
-            self.expect(type = 'identifier', parent = subroutineDecXML) #subroutineName
+        while self.checkIn(SUBROUTINE_KINDS):
+            try:
+                subroutineDecs.append(self.compileSubroutineDec())
+            except CompileError as error:
+                #A ';' can't end a subroutine, so skip to the next one
+                self.recoverFrom(error, SUBROUTINE_KINDS, semicolon = False)
+        
+        return subroutineDecs
 
-            self.expectBody(begin = '(', end = ')', interior = self.compileParameterList, parent = subroutineDecXML)
-            subroutineDecXML.addChild(self.compileSubroutineBody())
+    def compileSubroutineDec(self):
+        '''
+        Compiles a single function, method or constructor, starting at its kind
+        '''
+        subroutineDecXML = jack_xml.XML(tag = "subroutineDec")
+        self.expectIn(subroutineDecXML, SUBROUTINE_KINDS)
 
-            subroutineDecs.append(subroutineDecXML)
+        #Either a type or void
+        if self.checkKeyword('void'):
+            self.expectKeyword(subroutineDecXML, 'void')
+        else:
+            self.expectType(subroutineDecXML)
         
-        return subroutineDecs
+        self.expectKind(subroutineDecXML, IDENTIFIER) #subroutineName
+
+        self.expectBody(begin = '(', end = ')', interior = self.compileParameterList, parent = subroutineDecXML)
+        subroutineDecXML.addChild(self.compileSubroutineBody())
+
+        return subroutineDecXML
 
 
     
@@ -145,13 +376,13 @@ class Compiler:
         '''
         
         parameterListXML = jack_xml.XML(tag = 'parameterList')
-        if self.check(content = ['int', 'char', 'boolean']) or self.check(type = 'identifier'):
+        if self.checkIn(PRIMITIVE_TYPES) or self.checkKind(IDENTIFIER):
             self.expectType(parameterListXML)
-            self.expect(type = 'identifier', parent = parameterListXML)
-            while self.check(content = ','):
-                self.expect(content = ',', parent = parameterListXML)
+            self.expectKind(parameterListXML, IDENTIFIER)
+            while self.checkSymbol(','):
+                self.expectSymbol(parameterListXML, ',')
                 self.expectType(parent = parameterListXML)
-                self.expect(type = 'identifier', parent = parameterListXML)
+                self.expectKind(parameterListXML, IDENTIFIER)
         return parameterListXML
 
     def compileSubroutineBody(self):
@@ -160,10 +391,10 @@ class Compiler:
         Grammar: '{' varDec* statements '}'
         '''
         subroutineBodyXML = jack_xml.XML(tag = 'subroutineBody')
-        self.expect(content = '{', parent = subroutineBodyXML)
+        self.expectSymbol(subroutineBodyXML, '{')
         subroutineBodyXML.addChild(self.compileVarDec())
         subroutineBodyXML.addChild(self.compileStatements())
-        self.expect(content = '}', parent = subroutineBodyXML)
+        self.expectSymbol(subroutineBodyXML, '}')
         return subroutineBodyXML
 
     def compileVarDec(self):
@@ -172,15 +403,19 @@ class Compiler:
         Grammar: 'var' type varName (',' varName)* ';'
         '''
         varDecs = []
-        while self.check(content = 'var'):
+        while self.checkKeyword('var'):
             varDecXML = jack_xml.XML(tag = 'varDec')
-            self.expect(content = 'var', parent = varDecXML)
-            self.expectType(varDecXML)
-            self.expect(type = 'identifier', parent = varDecXML)
-            while self.check(content = ','):
-                self.expect(content = ',', parent = varDecXML)
-                self.expect(type = 'identifier', parent = varDecXML)
-            self.expect(content = ';', parent = varDecXML)
+            try:
+                self.expectKeyword(varDecXML, 'var')
+                self.expectType(varDecXML)
+                self.expectKind(varDecXML, IDENTIFIER)
+                while self.checkSymbol(','):
+                    self.expectSymbol(varDecXML, ',')
+                    self.expectKind(varDecXML, IDENTIFIER)
+                self.expectSymbol(varDecXML, ';')
+            except CompileError as error:
+                self.recoverFrom(error, VAR_DEC_STOPS)
+                continue
             varDecs.append(varDecXML)
         
         return varDecs
@@ -191,23 +426,20 @@ class Compiler:
         Compiles a sequence of statements
         '''
         statements = jack_xml.XML(tag = "statements")
-        has_statements = True
-
-        while has_statements:
-            token = self.tokens[self.cur_token_index]
-            match token.content:
-                case 'let':
-                    statements.addChild(self.compileLet())
-                case 'if':
-                    statements.addChild(self.compileIf())
-                case 'while':
-                    statements.addChild(self.compileWhile())
-                case 'do':
-                    statements.addChild(self.compileDo())
-                case 'return':
-                    statements.addChild(self.compileReturn())
-                case _:
-                    has_statements = False
+
+        while True:
+            token = self.tokens.peek()
+            production = STATEMENT_PRODUCTIONS.get(token)
+            try:
+                if production is not None:
+                    statements.addChild(getattr(self, production)())
+                #Only a '}' can end the statements, so when recovering anything else is reported and skipped
+                elif self.recover and token is not None and token is not CLOSE_BRACE:
+                    raise self.unexpected("a statement")
+                else:
+                    break
+            except CompileError as error:
+                self.recoverFrom(error, STATEMENT_KEYWORDS)
 
         return statements
     
@@ -216,13 +448,13 @@ class Compiler:
         Compiles a let statement that looks like let NAME = EXPRESSION;
         '''
         letXML = jack_xml.XML(tag = 'letStatement')
-        self.expect(content = 'let', parent = letXML)
-        self.expect(type = 'identifier', parent = letXML)
-        if self.check(content = '['):
+        self.expectKeyword(letXML, 'let')
+        self.expectKind(letXML, IDENTIFIER)
+        if self.checkSymbol('['):
             self.expectBody(begin = '[', end = ']', interior = self.compileExpression, parent = letXML)
-        self.expect(content = '=', parent = letXML)
+        self.expectSymbol(letXML, '=')
         letXML.addChild(self.compileExpression())
-        self.expect(content = ';', parent = letXML)
+        self.expectSymbol(letXML, ';')
         return letXML
 
     def compileIf(self):
@@ -230,11 +462,11 @@ class Compiler:
         Compiles a if statement that may have an else statement with grammar if (condition){ ... }else{ ... }
         '''
         ifXML = jack_xml.XML(tag = 'ifStatement')
-        self.expect(content = 'if', parent = ifXML)
+        self.expectKeyword(ifXML, 'if')
         self.expectBody(begin = '(', end = ')', interior = self.compileExpression, parent = ifXML)
         self.expectBody(begin = '{', end = '}', interior = self.compileStatements, parent = ifXML)
-        if self.check(content = 'else'):
-            self.expect(content = 'else', parent = ifXML)
+        if self.checkKeyword('else'):
+            self.expectKeyword(ifXML, 'else')
             self.expectBody(begin = '{', end = '}', interior = self.compileStatements, parent = ifXML)
         return ifXML
         
@@ -244,7 +476,7 @@ class Compiler:
         Compiles a while statement with grammar while(condition){...}
         '''
         whileXML = jack_xml.XML(tag = 'whileStatement')
-        self.expect(content = 'while', parent = whileXML)
+        self.expectKeyword(whileXML, 'while')
         self.expectBody(begin = '(', end = ')', interior = self.compileExpression, parent = whileXML)
         self.expectBody(begin = '{', end = '}', interior = self.compileStatements, parent = whileXML)
         return whileXML
@@ -254,13 +486,13 @@ class Compiler:
         Compiles a do statement with grammar do funcName(params);
         '''
         doXML = jack_xml.XML(tag = 'doStatement')
-        self.expect(content = 'do', parent = doXML)
-        self.expect(type = "identifier", parent = doXML)
-        while self.check(content = "."):
-            self.expect(content = ".", parent = doXML)
-            self.expect(type = "identifier", parent = doXML)
+        self.expectKeyword(doXML, 'do')
+        self.expectKind(doXML, IDENTIFIER)
+        while self.checkSymbol('.'):
+            self.expectSymbol(doXML, '.')
+            self.expectKind(doXML, IDENTIFIER)
         self.expectBody(begin = "(" ,end = ")", interior = self.compileExpressionList, parent = doXML)
-        self.expect(content = ';', parent = doXML)
+        self.expectSymbol(doXML, ';')
         return doXML
 
     def compileReturn(self):
@@ -268,22 +500,23 @@ class Compiler:
         Compiles a return statement with grammar return (returnValue?);
         '''
         returnXML = jack_xml.XML(tag = 'returnStatement')
-        self.expect(content = 'return', parent = returnXML)
-        if self.check(content = ';'):
-            self.expect(content = ';', parent = returnXML)
+        self.expectKeyword(returnXML, 'return')
+        if self.checkSymbol(';'):
+            self.expectSymbol(returnXML, ';')
         else:
             returnXML.addChild(self.compileExpression())
-            self.expect(content = ';', parent = returnXML)
+            self.expectSymbol(returnXML, ';')
         return returnXML
 
     
     def compileExpression(self):
-        #NOT IMPLEMENTED: Just assumes there is only one identifier
+        '''
+        Compiles an expression.
+
+        Grammar: term (op term)*
+        '''
         expressionXML = jack_xml.XML(tag = 'expression')
-        expressionXML.addChild(self.compileTerm())
-        if self.check(content = ['+', '-', '*', '/', '&', '|', '<', '>', '=']):
-            self.expect(type = 'symbol', parent = expressionXML)
-            expressionXML.addChild(self.compileTerm())
+        self.compileOperands(expressionXML)
         return expressionXML
 
     def compileTerm(self):
@@ -295,46 +528,129 @@ class Compiler:
         subroutineCall: subroutineName(expressionList) | (className | varName).subroutineName(expressionList)
         '''
         termXML = jack_xml.XML(tag = 'term')
-        #Check if is (expression)
-        if self.check(content = '('):
-            self.expectBody(begin = '(', end = ')', interior = self.compileExpression, parent = termXML)
-        #Check types of identifiers
-        elif self.check(type = 'identifier'):
-            self.expect(type = 'identifier', parent = termXML)
-            if self.check(content = '['):
-                self.expectBody(begin = '[', end = ']', interior = self.compileExpression, parent = termXML)
-            else :
+        self.compileOperands(None, termXML)
+        return termXML
+
+    def compileOperands(self, expressionXML, termXML = None):
+        '''
+        Compiles term (op term)* into expressionXML, or just a single term into termXML if that is given instead
+
+        This is a loop rather than recursion. Long operator chains are iterations, and the expressions nested
+        inside (...), [...] and argument lists are kept on an explicit stack along with what closes them, as
+        are chains of unary operators. So no input can make the Python stack grow
+        '''
+        #One entry per nested expression still open: (enclosing expression, closing symbol, term, expressionList)
+        pending = []
+        expression = expressionXML
+        term = termXML
+
+        while True:
+            if term is None:
+                term = jack_xml.XML(tag = 'term')
+                expression.addChild(term)
+
+            token = self.tokens.peek()
+            start = termStart(token)
+
+            #unaryOp term, each operator wraps the rest in a new term
+            while start == UNARY_TERM:
+                term.addChild(token.toXML())
+                self.tokens.advance()
+                inner = jack_xml.XML(tag = 'term')
+                term.addChild(inner)
+                term = inner
+                token = self.tokens.peek()
+                start = termStart(token)
+
+            if start is None:
+                #Nothing can start a term here, so report it as expect would
+                self.expect(type = CONSTANT_TYPES, parent = term)
+            term.addChild(token.toXML())
+            self.tokens.advance()
+
+            #(expression)
+            if start == NESTED_TERM:
+                pending.append((expression, ')', term, None))
+                expression = jack_xml.XML(tag = 'expression')
+                term.addChild(expression)
+                term = None
+                continue
+            #varName, varName[expression] or subroutineCall
+            elif start == NAME_TERM:
+                follow = self.tokens.peek()
+                if follow is OPEN_BRACKET:
+                    self.expectToken(term, OPEN_BRACKET)
+                    pending.append((expression, ']', term, None))
+                    expression = jack_xml.XML(tag = 'expression')
+                    term.addChild(expression)
+                    term = None
+                    continue
                 #A varName can't have a . in it, so only allow that if we are doing a function call - error otherwise
                 hasPeriod = False
-                while self.check(content = '.'):
+                while self.tokens.peek() is PERIOD:
                     hasPeriod = True
-                    self.expect(content = '.', parent = termXML)
-                    self.expect(type = 'identifier', parent = termXML)
-                if hasPeriod or self.check(content = '('):
-                    self.expectBody(begin = '(', end = ')', interior = self.compileExpressionList, parent = termXML)
-        #Check for unaryOp Term
-        elif self.check(content = ['-', '~']):
-            self.expect(type = 'symbol', parent = termXML)
-            termXML.addChild(self.compileTerm())
-        #Check for keywordConstant
-        elif self.check(content = ['true','false','null','this']):
-            self.expect(content = ['true','false','null','this'], parent = termXML)
-        else:
-            self.expect(type = ['integerConstant', 'stringConstant'], parent = termXML)
-        return termXML
+                    self.expectToken(term, PERIOD)
+                    self.expectKind(term, IDENTIFIER)
+                if hasPeriod or follow is OPEN_PAREN:
+                    self.expectToken(term, OPEN_PAREN)
+                    expressionListXML = jack_xml.XML(tag = 'expressionList')
+                    term.addChild(expressionListXML)
+                    if not self.checkSymbol(')'):
+                        pending.append((expression, ',', term, expressionListXML))
+                        expression = jack_xml.XML(tag = 'expression')
+                        expressionListXML.addChild(expression)
+                        term = None
+                        continue
+                    self.expectSymbol(term, ')')
+            #Otherwise an integerConstant, stringConstant or keywordConstant, which is just the token
+
+            #The term is complete. Either an operator continues its expression, or the expression is complete,
+            #and so is the term enclosing it, whose expression might then continue...
+            term = None
+            while True:
+                if expression is not None:
+                    token = self.tokens.peek()
+                    if token in OPS:
+                        expression.addChild(token.toXML())
+                        self.tokens.advance()
+                        break
+                if not pending:
+                    return
+                expression, closer, enclosing_term, expressionListXML = pending.pop()
+                if closer != ',':
+                    self.expectSymbol(enclosing_term, closer)
+                elif self.checkSymbol(','):
+                    #Next argument
+                    self.expectSymbol(expressionListXML, ',')
+                    pending.append((expression, closer, enclosing_term, expressionListXML))
+                    expression = jack_xml.XML(tag = 'expression')
+                    expressionListXML.addChild(expression)
+                    break
+                else:
+                    self.expectSymbol(enclosing_term, ')')
 
     def compileExpressionList(self):
         '''
         Compile a list of expressions
         '''
         expressonListXML = jack_xml.XML(tag = 'expressionList')
-        while not self.check(content = ')'):
+        while not self.checkSymbol(')'):
             expressonListXML.addChild(self.compileExpression())
-            while self.check(content = ','):
-                self.expect(content = ',', parent = expressonListXML)
+            while self.checkSymbol(','):
+                self.expectSymbol(expressonListXML, ',')
                 expressonListXML.addChild(self.compileExpression())
         return expressonListXML
 
 
 class CompileError(Exception):
-    pass
+    def __init__(self, message, line = None, column = None):
+        '''
+        line and column are 1-based, and are None when the error isn't tied to a place in the source
+        '''
+        self.message = message
+        self.line = line
+        self.column = column
+        if line is None:
+            super().__init__(message)
+        else:
+            super().__init__(f"Line {line}, column {column}: {message}")
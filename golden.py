@@ -0,0 +1,141 @@
+"""
+golden.py
+
+Compares the compiler's output against reference .xml files, as graders do, without rendering our output or
+loading the reference as a whole. The reference is streamed with iterparse and checked element by element against
+a walk of our tree, stopping at the first difference.
+
+Whitespace around text is ignored, and an element with no children matches one holding only whitespace, so
+references that are laid out differently from XML.display still match.
+A reference whose root is <tokens> (the T.xml files) is compared with the tokens instead of the parse tree.
+"""
+
+import os
+import xml.etree.ElementTree as ElementTree
+from compiler import Compiler
+from tokenizer import Tokenizer
+
+#The events both sides are turned into
+OPEN, LEAF, CLOSE = 'open', 'leaf', 'close'
+
+def treeEvents(tree):
+    """
+    Yields (event, tag, text) for tree in document order: OPEN and CLOSE around a node with children, and
+    LEAF for one without, with its text stripped
+    """
+    pending = [tree]
+    while pending:
+        item = pending.pop()
+        if type(item) is tuple:
+            yield item
+        elif item.children:
+            tag = item.tag
+            yield OPEN, tag, None
+            pending.append((CLOSE, tag, None))
+            pending.extend(reversed(item.children))
+        else:
+            yield LEAF, item.tag, (item.text or '').strip()
+
+def tokenEvents(source):
+    """Yields the events of the tokens XML for source, as Analyzer.test_tokenizer would build it"""
+    yield OPEN, 'tokens', None
+    for token in Tokenizer(source).iterTokens(source):
+        yield LEAF, token.type, token.content.strip()
+    yield CLOSE, 'tokens', None
+
+def referenceEvents(reference):
+    """
+    Yields the events of the reference file as it is parsed, freeing each element once it has been compared
+    An element is only known to be a leaf when it ends before any child starts, so its start is held back until then
+    """
+    held = None #An element that has started, but may yet turn out to be a leaf
+    stack = []
+    with open(reference, 'rb') as f:
+        for event, element in ElementTree.iterparse(f, events = ('start', 'end')):
+            if event == 'start':
+                if held is not None:
+                    yield OPEN, held.tag, None
+                held = element
+                stack.append(element)
+            else:
+                stack.pop()
+                if held is element:
+                    yield LEAF, element.tag, (element.text or '').strip()
+                    held = None
+                else:
+                    yield CLOSE, element.tag, None
+                #Nothing more is needed from the element's parent than its tag, so drop what has been read of it
+                if stack:
+                    stack[-1].clear()
+
+def compareEvents(ours, reference):
+    """
+    Compares two event streams, and returns None if they match, or a message giving the path to the first
+    node that differs, like class[1]/subroutineDec[2]/subroutineBody[1]/statements[1]/letStatement[3]
+    """
+    path = [] #The (tag, index) of each open element
+    counts = [{}] #How many of each tag have been seen, for each open element
+    missing = (None, None, None)
+    for expected in reference:
+        got = next(ours, missing)
+        event, tag, text = expected
+        if event != CLOSE:
+            index = counts[-1][tag] = counts[-1].get(tag, 0) + 1
+
+        if got != expected:
+            steps = path if event == CLOSE else path + [(tag, index)]
+            location = '/'.join(f"{t}[{i}]" for t, i in steps)
+            return f"{location}: expected {describe(expected)}, got {describe(got)}"
+        if event == OPEN:
+            path.append((tag, index))
+            counts.append({})
+        elif event == CLOSE:
+            path.pop()
+            counts.pop()
+
+    extra = next(ours, None)
+    if extra is not None:
+        return f"after the end of the reference: got {describe(extra)}"
+    return None
+
+def describe(event):
+    event, tag, text = event
+    if event is None:
+        return "the end of the output"
+    elif event == OPEN:
+        return f"<{tag}> with children"
+    elif event == CLOSE:
+        return f"the end of <{tag}>"
+    return f"<{tag}> {text!r}"
+
+def rootTag(reference):
+    """Returns the tag of the root element of the reference file, reading only as far as its start"""
+    with open(reference, 'rb') as f:
+        for event, element in ElementTree.iterparse(f, events = ('start',)):
+            return element.tag
+
+def compareSource(source, reference):
+    """
+    Compiles source, and compares the result with reference, the path of a reference .xml or T.xml file
+    Returns None if they match, otherwise a message locating the first difference
+    """
+    try:
+        root = rootTag(reference)
+    except ElementTree.ParseError as e:
+        return f"the reference isn't valid XML: {e}"
+    if root == 'tokens':
+        ours = tokenEvents(source)
+    else:
+        ours = treeEvents(Compiler(source).compileClass())
+    try:
+        return compareEvents(ours, referenceEvents(reference))
+    except ElementTree.ParseError as e:
+        return f"the reference isn't valid XML: {e}"
+
+def referencePaths(file_path, directory, reference_directory):
+    """
+    Returns the reference files for a .jack file under directory, found at the same relative path under
+    reference_directory: Name.xml for the parse tree and NameT.xml for the tokens, whichever exist
+    """
+    base_path = os.path.join(reference_directory, os.path.relpath(os.path.splitext(file_path)[0], directory))
+    return [base_path + suffix for suffix in ('T.xml', '.xml') if os.path.exists(base_path + suffix)]
@@ -0,0 +1,130 @@
+"""
+incremental.py
+
+Incremental reparsing, for editors that recompile a large class after every change to it.
+Each subroutineDec is cached under a hash of its tokens, along with its rendered XML once that is asked for.
+Reparsing the edited source reuses every subroutine whose tokens are unchanged, so only the edited subroutines
+are parsed again. The source is still scanned in full, as that is needed to find where each subroutine ends.
+
+    cache = SubroutineCache()
+    tree = IncrementalCompiler(source, cache).compileClass()
+    xml = cache.display(tree)
+    ...
+    tree = IncrementalCompiler(edited_source, cache).compileClass()
+"""
+
+import hashlib
+from itertools import islice
+from compiler import Compiler, SYMBOL_TOKENS
+from jack_xml import SUBROUTINE_DEC
+
+OPEN_BRACE = SYMBOL_TOKENS['{']
+CLOSE_BRACE = SYMBOL_TOKENS['}']
+
+class CachedSubroutine:
+    __slots__ = ('tree', 'text')
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.text = None #The rendered XML of tree, filled in the first time it is displayed
+
+class SubroutineCache:
+    def __init__(self):
+        """
+        entries maps the hash of a subroutine's tokens to its CachedSubroutine
+        Only the subroutines of the last successful parse are kept, so the cache stays the size of one class
+        """
+        self.entries = {}
+        self.nodes = {} #id of each cached subroutineDec node to its CachedSubroutine
+        self.hits = 0
+        self.misses = 0
+
+    def replace(self, entries):
+        """Keeps just entries, the subroutines of the class that was just parsed"""
+        self.entries = entries
+        self.nodes = {id(entry.tree): entry for entry in entries.values()}
+
+    def rendered(self, classXML):
+        """
+        Returns the rendered text of each cached subroutine in classXML, as the dict XML.iterChunks takes,
+        rendering the ones that haven't been displayed yet
+        """
+        texts = {}
+        for child in classXML.children:
+            entry = self.nodes.get(id(child)) if child.tag_id == SUBROUTINE_DEC else None
+            if entry is not None:
+                if entry.text is None:
+                    entry.text = child.display()
+                texts[id(child)] = entry.text
+        return texts
+
+    def display(self, classXML):
+        """
+        Returns the XML text of a class parsed by IncrementalCompiler, as classXML.display() would, reusing the
+        rendered text of every cached subroutine
+        """
+        return classXML.display(self.rendered(classXML))
+
+    def write(self, classXML, stream):
+        classXML.write(stream, self.rendered(classXML))
+
+class IncrementalCompiler(Compiler):
+    def __init__(self, file, cache, lazy = True):
+        '''
+        cache - the SubroutineCache shared between parses of the same class
+        '''
+        super().__init__(file, lazy)
+        self.cache = cache
+        self.parsed = {} #The entries for the subroutines of this parse
+
+    def compileSubroutine(self):
+        subroutineDecs = super().compileSubroutine()
+        self.cache.replace(self.parsed)
+        return subroutineDecs
+
+    def compileSubroutineDec(self):
+        '''
+        Reuses the cached subtree if the tokens of this subroutine are unchanged, otherwise parses it
+        '''
+        length = self.subroutineLength()
+        if length is None:
+            #Unbalanced braces, so leave it to the parser to report the error
+            return super().compileSubroutineDec()
+
+        digest = self.hashTokens(length)
+        entry = self.cache.entries.get(digest) or self.parsed.get(digest)
+        if entry is not None:
+            self.cache.hits += 1
+            for _ in range(length):
+                self.tokens.advance()
+        else:
+            self.cache.misses += 1
+            entry = CachedSubroutine(super().compileSubroutineDec())
+        self.parsed[digest] = entry
+        return entry.tree
+
+    def subroutineLength(self):
+        '''
+        Returns the number of tokens from the current one to the brace that closes the subroutine's body,
+        or None if the file ends first
+        '''
+        depth = 0
+        offset = 0
+        while True:
+            token = self.tokens.peek(offset)
+            offset += 1
+            if token is None:
+                return None
+            elif token is OPEN_BRACE:
+                depth += 1
+            elif token is CLOSE_BRACE:
+                depth -= 1
+                if depth == 0:
+                    return offset
+
+    def hashTokens(self, length):
+        '''Returns a digest of the kind and content of the next length tokens'''
+        digest = hashlib.blake2b(digest_size = 16)
+        tokens = islice(self.tokens.buffer, length)
+        digest.update(''.join([f"{token.kind}:{len(token.content)}:{token.content}" for token in tokens]).encode())
+        return digest.digest()
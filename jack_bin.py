@@ -0,0 +1,156 @@
+"""
+jack_bin.py
+
+A compact binary format for parse trees, so that tools which only need the tree can load it far faster than
+compiling the source again or parsing the .xml output.
+
+Layout, with every int little-endian:
+- MAGIC
+- HEADER: the lengths of the sections that follow
+- The tag names, joined by newlines. Nodes refer to tags by their index here, so ids registered at runtime are
+  mapped back to this process's own ids on loading
+- The leaf table: each distinct leaf, as a tag index (uint16) and the length of its text (uint32), then all the
+  texts joined, as UTF-8
+- For each node in breadth first order, a uint32: for a leaf its index in the leaf table, otherwise PARENT
+- For each parent in the same order, its tag index (uint16), then for each its number of children (uint32)
+
+In breadth first order the children of each parent are next to each other, and come in the same order as the
+parents, so loading can give each parent its children as one slice of the list of nodes
+"""
+
+import gc
+import struct
+import sys
+from array import array
+import jack_xml
+
+MAGIC = b'JACKTREE\x01'
+HEADER = struct.Struct('<IIIII') #Tag name bytes, number of leaves, leaf text bytes, number of nodes, number of parents
+PARENT = 0x80000000
+
+class TreeFormatError(Exception):
+    """Raised when loading data that isn't a tree in this format."""
+    pass
+
+def littleEndian(values):
+    """Returns the bytes of an array in little-endian order, whatever the platform's order"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def fromLittleEndian(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def encode(tree):
+    """Returns tree, an XML object, in the binary format"""
+    leaves = {}
+    values = array('I')
+    parent_tags = array('H')
+    counts = array('I')
+    level = [tree]
+    while level:
+        next_level = []
+        for node in level:
+            if node.text is not None:
+                index = leaves.get((node.tag_id, node.text))
+                if index is None:
+                    index = leaves[(node.tag_id, node.text)] = len(leaves)
+                values.append(index)
+            else:
+                values.append(PARENT)
+                parent_tags.append(node.tag_id)
+                counts.append(len(node.children))
+                next_level.extend(node.children)
+        level = next_level
+
+    tag_names = '\n'.join(jack_xml.TAGS).encode()
+    leaf_tags = array('H', [tag_id for tag_id, text in leaves])
+    lengths = array('I', [len(text) for tag_id, text in leaves])
+    texts = ''.join([text for tag_id, text in leaves]).encode()
+    return b''.join((MAGIC, HEADER.pack(len(tag_names), len(leaves), len(texts), len(values), len(parent_tags)),
+                     tag_names, littleEndian(leaf_tags), littleEndian(lengths), texts, littleEndian(values),
+                     littleEndian(parent_tags), littleEndian(counts)))
+
+def decode(data):
+    """
+    Rebuilds the tree from data in the binary format, and returns its root XML object
+    Leaves with the same tag and text are shared between their parents, so the tree should be treated as
+    read-only, as the compiler's own trees are
+    """
+    data = memoryview(data)
+    if data[:len(MAGIC)] != MAGIC:
+        raise TreeFormatError("Not a binary parse tree, or one from a different version of the format")
+    position = len(MAGIC)
+    tag_bytes, leaf_count, text_bytes, node_count, parent_count = HEADER.unpack_from(data, position)
+    position += HEADER.size
+
+    def section(length):
+        nonlocal position
+        start = position
+        position += length
+        if position > len(data):
+            raise TreeFormatError("Binary parse tree is truncated")
+        return data[start:position]
+
+    tag_ids = [jack_xml.tagId(tag) for tag in bytes(section(tag_bytes)).decode().split('\n')]
+    leaf_tags = fromLittleEndian('H', section(leaf_count * 2))
+    lengths = fromLittleEndian('I', section(leaf_count * 4))
+    text = bytes(section(text_bytes)).decode()
+    values = fromLittleEndian('I', section(node_count * 4))
+    parent_tags = fromLittleEndian('H', section(parent_count * 2))
+    counts = fromLittleEndian('I', section(parent_count * 4))
+
+    #The tree has no reference cycles, so collecting while it is built would only slow the build down
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return buildTree(tag_ids, leaf_tags, lengths, text, values, parent_tags, counts)
+    finally:
+        if collecting:
+            gc.enable()
+
+def buildTree(tag_ids, leaf_tags, lengths, text, values, parent_tags, counts):
+    """Creates the nodes from the sections of decode, and returns the root"""
+    XML = jack_xml.XML
+    new = XML.__new__
+    NO_CHILDREN = jack_xml.NO_CHILDREN
+    leaves = []
+    end = 0
+    for tag, length in zip(leaf_tags, lengths):
+        leaf = new(XML)
+        leaf.tag_id = tag_ids[tag]
+        leaf.text = text[end:end + length]
+        leaf.children = NO_CHILDREN
+        leaves.append(leaf)
+        end += length
+
+    #Every node at once, with the parents as blank objects that are filled in below
+    parents = [new(XML) for _ in range(len(counts))]
+    next_parent = iter(parents).__next__
+    nodes = [next_parent() if value == PARENT else leaves[value] for value in values]
+
+    start = 1 #Where the children of the next parent start
+    for node, tag, count in zip(parents, parent_tags, counts):
+        node.tag_id = tag_ids[tag]
+        node.text = None
+        if count:
+            node.children = nodes[start:start + count]
+            start += count
+        else:
+            node.children = NO_CHILDREN
+    return nodes[0] if nodes else None
+
+def writeTree(tree, path):
+    """Writes tree to the file at path in the binary format"""
+    with open(path, 'wb') as o:
+        o.write(encode(tree))
+
+def readTree(path):
+    """Loads the tree in the binary format from the file at path"""
+    with open(path, 'rb') as f:
+        return decode(f.read())
@@ -4,84 +4,136 @@ jack_xml.py
 This is for implementing the xml syntax used by the tokenizer and parser for the compiler.
 """
 
+#Every tag is stored on a node as a small int id. The tags the tokenizer and parser produce are registered up
+#front, in this order, so their ids are stable. Other tags get the next free id the first time they are seen
+TAGS = ['keyword', 'symbol', 'identifier', 'integerConstant', 'stringConstant', 'tokens',
+        'class', 'classVarDec', 'subroutineDec', 'parameterList', 'subroutineBody', 'varDec',
+        'statements', 'letStatement', 'ifStatement', 'whileStatement', 'doStatement', 'returnStatement',
+        'expression', 'term', 'expressionList']
+TAG_IDS = {tag: tag_id for tag_id, tag in enumerate(TAGS)}
+
+(KEYWORD, SYMBOL, IDENTIFIER, INTEGER_CONSTANT, STRING_CONSTANT, TOKENS,
+ CLASS, CLASS_VAR_DEC, SUBROUTINE_DEC, PARAMETER_LIST, SUBROUTINE_BODY, VAR_DEC,
+ STATEMENTS, LET_STATEMENT, IF_STATEMENT, WHILE_STATEMENT, DO_STATEMENT, RETURN_STATEMENT,
+ EXPRESSION, TERM, EXPRESSION_LIST) = range(len(TAGS))
+
+NO_CHILDREN = ()
+
+def tagId(tag):
+    """Returns the id for tag, registering it if it hasn't been seen before"""
+    tag_id = TAG_IDS.get(tag)
+    if tag_id is None:
+        tag_id = TAG_IDS[tag] = len(TAGS)
+        TAGS.append(tag)
+    return tag_id
+
 class XML:
+    __slots__ = ('tag_id', 'text', 'children')
+
     def __init__(self, tag, content = None):
         """
         Initializes the object.
         - tag (str): the XML tag name
         - content: The content inside the XML tag. It can be either a string, another XML object a list of XML objects, or None
+
+        A node holds either text (a string) or a list of children. Nodes without children share the empty
+        tuple NO_CHILDREN instead of each allocating a list, since most nodes are token leaves
         """
-        self.tag = tag
-        self.content = content 
-        
-    def isStringContent(self):
-        """Returns whether self.content is a string"""
-        return isinstance(self.content, str)
+        self.tag_id = TAG_IDS.get(tag)
+        if self.tag_id is None:
+            self.tag_id = tagId(tag)
+        self.text = None
+        self.children = NO_CHILDREN
+        if content is not None:
+            self.addChild(content)
+
+    @property
+    def tag(self):
+        return TAGS[self.tag_id]
 
-    def isXmlContent(self):
-        """Returns whether self.content is an XML object"""
-        return isinstance(self.content, XML)
-    
-    def isXmlListContent(self):
-        """Returns whether self.content is a list of XMl""" 
-        return isinstance(self.content, list) and all(isinstance(item, XML) for item in self.content)
+    @property
+    def content(self):
+        """The text of the node if it has some, otherwise its list of children, or None if it is empty"""
+        if self.text is not None:
+            return self.text
+        return self.children or None
+
+    def isStringContent(self):
+        """Returns whether the node holds text"""
+        return self.text is not None
 
     def isNone(self):
-        return self.content == None
+        """Returns whether the node holds neither text nor children"""
+        return self.text is None and not self.children
 
     def addChild(self, child):
         """Adds a child to the current XML content
         Child can be anything content can be, but adding None will do nothing
         Children cant be added if the XML holds string content, it will raise an error
         """
-        if child == None or child == []: 
+        if child is None:
             return
-        elif self.isNone():
-            self.content = child
-        elif isinstance(child, str) or self.isStringContent():
-            ###Can't add string as a child unless no content
+        elif self.text is not None:
             raise XMLError()
-        elif self.isXmlContent():
-            if isinstance(child, list):
-                self.content = [self.content] + child
+        elif isinstance(child, XML):
+            if self.children:
+                self.children.append(child)
             else:
-                self.content = [self.content, child]
-        elif self.isXmlListContent():
-            if isinstance(child, list):
-                self.content = self.content + child
-            else:
-                self.content.append(child)
-        elif self.isNone():
-            self.content = child
+                self.children = [child]
+        elif isinstance(child, list):
+            if self.children:
+                self.children.extend(child)
+            elif child:
+                self.children = list(child)
+        elif self.children:
+            ###Can't add string as a child unless no content
+            raise XMLError()
+        else:
+            self.text = child
 
-    def display(self):
+    def display(self, rendered = None):
         """Returns a string representation of the XML content"""
+        return ''.join(self.iterChunks(rendered))
+
+    def write(self, stream, rendered = None):
+        """Writes the string representation of the XML content to stream, a file-like object"""
+        stream.writelines(self.iterChunks(rendered))
+
+    def iterChunks(self, rendered = None):
+        """
+        Yields the string representation of the XML content piece by piece, walking the tree once
+        The walk uses an explicit stack of pending nodes and strings, so deep trees don't recurse
+
+        rendered - a dict from the id() of nodes with children to their text, as display would return it, which
+                   is used instead of walking those nodes again
+        """
+        pending = [self]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, str):
+                yield item
+            elif rendered is not None and item.children and id(item) in rendered:
+                yield rendered[id(item)]
+            elif item.text is not None:
+                #These symbols aren't able to be rendered by xml in browsers, so we replace them
+                tag = TAGS[item.tag_id]
+                yield f"<{tag}> {ESCAPES.get(item.text, item.text)} </{tag}>"
+            elif item.children:
+                tag = TAGS[item.tag_id]
+                yield f"<{tag}>\n\t"
+                pending.append(f" \n</{tag}>")
+                #Pushed in reverse so the first child comes off the stack first
+                children = item.children
+                for i in range(len(children) - 1, 0, -1):
+                    pending.append(children[i])
+                    pending.append('\n\t')
+                pending.append(children[0])
+            else:
+                tag = TAGS[item.tag_id]
+                yield f"<{tag}>\n</{tag}>"
+
+ESCAPES = {'<': '&lt;', '>': '&gt;', '"': '&quot;', '&': '&amp;'}
 
-        if self.isStringContent():
-            #These symbols aren't able to be rendered by xml in browsers, so we replace them
-            xml_safe_content = self.content
-            match self.content:
-                case '<':
-                    xml_safe_content = '&lt;'
-                case '>':
-                    xml_safe_content = '&gt;'
-                case '"':
-                    xml_safe_content = 'quot;'
-                case '&':
-                    xml_safe_content = '&amp;'
-
-            return f"<{self.tag}> {xml_safe_content} </{self.tag}>"
-        
-        if self.isXmlContent():
-            return f"<{self.tag}>\n\t {self.content.display()} \n</{self.tag}>"
-
-        if self.isXmlListContent():
-            children_displayed = '\n\t'.join([subcontent.display() for subcontent in self.content])
-            return f'''<{self.tag}>\n\t{children_displayed} \n</{self.tag}>'''
-
-        if self.isNone():
-            return f"<{self.tag}>\n</{self.tag}>"
-        
 class XMLError(Exception):
     """Custom exception for XML-related errors."""
     pass
@@ -0,0 +1,181 @@
+"""
+profiler.py
+
+Records where the time goes when compiling: wall time and, optionally, peak memory for each phase of each file,
+token and node counts, and call counts and times for each Compiler production.
+
+Terms and the expressions nested in them are parsed inline by Compiler.compileOperands rather than by calls to
+compileTerm and compileExpression, so their time is part of compileOperands, and those two productions only count
+the calls made from elsewhere. How many of each were parsed is recorded for each file instead, as node_tags, the
+number of nodes in its parse tree with each tag.
+
+The report is written as JSON, or as collapsed stacks (file;phase;production... microseconds) for flamegraph.pl
+and similar tools. From the cli, use --profile PATH. From code:
+
+    profiler = Profiler()
+    results = profileFiles(['Main.jack'], profiler)
+    profiler.write('profile.json')
+"""
+
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from analyzer import Analyzer, mapSource, outputPaths, writeOutputs
+from compiler import Compiler
+
+FORMATS = ('json', 'collapsed')
+
+class ProductionStats:
+    __slots__ = ('calls', 'total', 'own')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0 #Including time spent in nested productions
+        self.own = 0.0 #Excluding it
+
+class Profiler:
+    def __init__(self, memory = False):
+        """
+        memory - if true, the peak memory allocated in each phase is recorded with tracemalloc as well
+                 This makes every phase several times slower, so leave it off when comparing times
+        """
+        self.memory = memory
+        self.files = [] #A dict for each profiled file, see startFile
+        self.productions = {} #Name of each Compiler production to its ProductionStats, over all files
+        self.stacks = Counter() #Collapsed stack to its own time in seconds
+        self.current = None
+        self.nested = 0.0 #Time of the current phase already counted against instrumented productions
+
+    def startFile(self, file_path):
+        """Starts the record that the following phases are added to, and returns it"""
+        self.current = {'file': file_path, 'phases': {}, 'tokens': None, 'nodes': None, 'node_tags': None,
+                        'error': None}
+        self.files.append(self.current)
+        return self.current
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Records the wall time, and the peak memory if enabled, of the code in the with block as a phase of the
+        current file
+        """
+        record = {'seconds': None, 'peak_memory': None}
+        self.current['phases'][name] = record
+        self.nested = 0.0
+        if self.memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.memory:
+                record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.stacks[f"{self.current['file']};{name}"] += record['seconds'] - self.nested
+
+    def instrument(self, compiler, phase = 'parse', prefixes = ('compile',)):
+        """
+        Replaces the compile* productions of compiler with wrappers that count their calls and time, both in total
+        and for each stack of productions they were called through
+        The wrappers add their own overhead, so the parse phase is slower while instrumented
+
+        prefixes - the names of the methods to wrap start with one of these, so the token helpers can be included
+                   with ('compile', 'expect', 'check')
+        """
+        names = [] #The productions active right now, outermost first
+        children = [] #Time spent in nested productions, for each active call
+        prefix = f"{self.current['file']};{phase}"
+
+        def wrap(name, method):
+            stats = self.productions.setdefault(name, ProductionStats())
+            def timed(*args, **kwargs):
+                names.append(name)
+                children.append(0.0)
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    own = elapsed - children.pop()
+                    if children:
+                        children[-1] += elapsed
+                    else:
+                        self.nested += elapsed
+                    stats.calls += 1
+                    stats.total += elapsed
+                    stats.own += own
+                    self.stacks[';'.join((prefix, *names))] += own
+                    names.pop()
+            return timed
+
+        for name in dir(compiler):
+            if name.startswith(prefixes):
+                setattr(compiler, name, wrap(name, getattr(compiler, name)))
+
+    def toJSON(self):
+        """Returns the report as a JSON-serializable dict"""
+        #Productions that were wrapped but never called, like compileTerm, are left out
+        productions = {name: {'calls': stats.calls, 'total_seconds': stats.total, 'own_seconds': stats.own}
+                       for name, stats in sorted(self.productions.items(), key = lambda item: -item[1].own)
+                       if stats.calls}
+        return {'files': self.files, 'productions': productions}
+
+    def collapsedStacks(self):
+        """Returns the report as collapsed stacks, one 'frame;frame;... microseconds' line per stack"""
+        return ''.join(f"{stack} {round(seconds * 1e6)}\n" for stack, seconds in self.stacks.items())
+
+    def write(self, path, format = 'json'):
+        """Writes the report to path in format, one of FORMATS"""
+        with open(path, 'w') as o:
+            if format == 'json':
+                json.dump(self.toJSON(), o, indent = 2)
+            else:
+                o.write(self.collapsedStacks())
+
+def countTags(tree):
+    """Returns a Counter of the tags of the XML nodes in tree, including itself"""
+    counts = Counter()
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        counts[node.tag] += 1
+        pending.extend(node.children)
+    return counts
+
+def profileFile(file_path, profiler, optimize = False, binary = False):
+    """
+    Compiles a .jack file as compileFile does, recording each phase in profiler
+    Tokenizing is done up front rather than as the parser asks, so that it can be timed on its own
+    The build cache isn't used, as a cached file has nothing to profile
+
+    Returns (file_path, error, vm_counts), as tryCompileFile does
+    """
+    record = profiler.startFile(file_path)
+    try:
+        with open(file_path, 'rb') as f:
+            with profiler.phase('read'):
+                source = mapSource(f)
+            with source:
+                analyzer = Analyzer(source)
+                with profiler.phase('tokenize'):
+                    compiler = Compiler(source, lazy = False)
+                profiler.instrument(compiler)
+                with profiler.phase('parse'):
+                    tree = compiler.compileClass()
+        record['tokens'] = compiler.tokens.index
+        node_tags = countTags(tree)
+        record['nodes'] = sum(node_tags.values())
+        record['node_tags'] = dict(node_tags.most_common())
+        vm_counts = writeOutputs(analyzer, tree, outputPaths(file_path, binary), optimize, phase = profiler.phase)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        return file_path, record['error'], None
+    return file_path, None, vm_counts
+
+def profileFiles(file_paths, profiler, optimize = False, binary = False):
+    """Profiles each file in file_paths in turn, returning the results as compileFiles does"""
+    return [profileFile(file_path, profiler, optimize, binary) for file_path in file_paths]
@@ -0,0 +1,61 @@
+"""
+symbol_table.py
+
+Keeps track of the variables in scope while generating code for a class.
+"""
+
+from compiler import CompileError
+
+#The kinds of variable, and the VM memory segment each one lives in
+SEGMENTS = {'static': 'static', 'field': 'this', 'arg': 'argument', 'var': 'local'}
+CLASS_KINDS = frozenset(('static', 'field'))
+
+class Symbol:
+    __slots__ = ('type', 'kind', 'index')
+
+    def __init__(self, type, kind, index):
+        self.type = type
+        self.kind = kind
+        self.index = index
+
+    @property
+    def segment(self):
+        return SEGMENTS[self.kind]
+
+class SymbolTable:
+    def __init__(self):
+        """
+        Static and field variables go in the class scope, arguments and local variables in the subroutine scope
+        Both are dicts, so defining and looking up a name is O(1)
+        """
+        self.class_scope = {}
+        self.subroutine_scope = {}
+        self.counts = dict.fromkeys(SEGMENTS, 0)
+
+    def startSubroutine(self):
+        """Clears the subroutine scope, ready for the next subroutine"""
+        self.subroutine_scope = {}
+        self.counts['arg'] = 0
+        self.counts['var'] = 0
+
+    def define(self, name, type, kind):
+        """
+        Adds a variable, giving it the next index for its kind
+        - kind (str): one of 'static', 'field', 'arg' or 'var'
+        """
+        scope = self.class_scope if kind in CLASS_KINDS else self.subroutine_scope
+        if name in scope:
+            raise CompileError(f"Variable {name} is already defined")
+        scope[name] = Symbol(type, kind, self.counts[kind])
+        self.counts[kind] += 1
+
+    def varCount(self, kind):
+        """Returns how many variables of kind are defined in the current scope"""
+        return self.counts[kind]
+
+    def lookup(self, name):
+        """Returns the Symbol for name, looking in the subroutine scope first, or None if it isn't defined"""
+        symbol = self.subroutine_scope.get(name)
+        if symbol is None:
+            symbol = self.class_scope.get(name)
+        return symbol
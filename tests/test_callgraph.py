@@ -0,0 +1,76 @@
+"""
+Tests for the call graph behind analyzer.py --prune.
+Run from the repository root: python -m pytest tests
+"""
+
+import os
+import tempfile
+import unittest
+from analyzer import compileProject
+
+#A program that bundles its own Math, String and Sys, which the generated code calls without the source saying so
+PROJECT = {
+    'Main.jack': '''
+class Main {
+    field int size;
+    constructor Main new() { let size = 2; return this; }
+    function void main() {
+        var Main m;
+        let m = Main.new();
+        do Output.printString("hi");
+        do Output.printInt(m.size() * 3);
+        return;
+    }
+    method int size() { return size / 1; }
+}''',
+    'Math.jack': '''
+class Math {
+    function int multiply(int x, int y) { return 0; }
+    function int divide(int x, int y) { return 0; }
+    function int unused() { return 0; }
+}''',
+    'String.jack': '''
+class String {
+    constructor String new(int length) { return this; }
+    method String appendChar(char c) { return this; }
+}''',
+    'Sys.jack': '''
+class Sys {
+    function void init() { do Main.main(); return; }
+    function void halt() { return; }
+}''',
+    'Memory.jack': '''
+class Memory {
+    function int alloc(int size) { return 0; }
+}''',
+}
+
+class PruneTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_paths = []
+        for name, source in PROJECT.items():
+            file_path = os.path.join(self.directory.name, name)
+            with open(file_path, 'w') as f:
+                f.write(source)
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def functions(self, name):
+        with open(os.path.join(self.directory.name, name + '.vm')) as f:
+            return {line.split()[1] for line in f if line.startswith('function ')}
+
+    def test_keeps_implicit_calls_and_sys_init(self):
+        results, subroutines, kept = compileProject(self.file_paths)
+        self.assertEqual([error for file_path, error, vm_counts in results], [None] * len(PROJECT))
+        self.assertEqual((subroutines, kept), (11, 9))
+        self.assertEqual(self.functions('Main'), {'Main.new', 'Main.main', 'Main.size'})
+        self.assertEqual(self.functions('Math'), {'Math.multiply', 'Math.divide'})
+        self.assertEqual(self.functions('String'), {'String.new', 'String.appendChar'})
+        self.assertEqual(self.functions('Sys'), {'Sys.init'})
+        self.assertEqual(self.functions('Memory'), {'Memory.alloc'})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for the VM code generated from the parse tree.
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+from compiler import Compiler
+from code_generator import CodeGenerator
+
+SOURCE = '''
+    class Point {
+        field int x, y;
+        static int count;
+
+        constructor Point new(int ax) {
+            let x = ax;
+            let count = count + 1;
+            return this;
+        }
+
+        method int copy(Array a, Array b, int i, int j) {
+            var String s;
+            let a[i] = b[j];
+            let s = "hi";
+            if (x > 0) {
+                let x = x - 1;
+            } else {
+                let x = -x;
+            }
+            while (~(i = j)) {
+                do s.appendChar(i);
+                let i = i + 1;
+            }
+            return x;
+        }
+    }
+'''
+
+#The exact VM code for SOURCE, so that changes to the parser or code generator can't change it unnoticed
+EXPECTED = '''
+    function Point.new 0
+    push constant 2
+    call Memory.alloc 1
+    pop pointer 0
+    push argument 0
+    pop this 0
+    push static 0
+    push constant 1
+    add
+    pop static 0
+    push pointer 0
+    return
+    function Point.copy 1
+    push argument 0
+    pop pointer 0
+    push argument 1
+    push argument 3
+    add
+    push argument 2
+    push argument 4
+    add
+    pop pointer 1
+    push that 0
+    pop temp 0
+    pop pointer 1
+    push temp 0
+    pop that 0
+    push constant 2
+    call String.new 1
+    push constant 104
+    call String.appendChar 2
+    push constant 105
+    call String.appendChar 2
+    pop local 0
+    push this 0
+    push constant 0
+    gt
+    not
+    if-goto IF_FALSE0
+    push this 0
+    push constant 1
+    sub
+    pop this 0
+    goto IF_END0
+    label IF_FALSE0
+    push this 0
+    neg
+    pop this 0
+    label IF_END0
+    label WHILE_EXP1
+    push argument 3
+    push argument 4
+    eq
+    not
+    not
+    if-goto WHILE_END1
+    push local 0
+    push argument 3
+    call String.appendChar 2
+    pop temp 0
+    push argument 3
+    push constant 1
+    add
+    pop argument 3
+    goto WHILE_EXP1
+    label WHILE_END1
+    push this 0
+    return
+'''
+
+class CodeGeneratorTest(unittest.TestCase):
+    def test_class(self):
+        writer = CodeGenerator().compileClass(Compiler(SOURCE).compileClass())
+        expected = [line.strip() for line in EXPECTED.strip().split('\n')]
+        self.assertEqual([' '.join(map(str, command)) for command in writer.commands], expected)
+
+if __name__ == "__main__":
+    unittest.main()
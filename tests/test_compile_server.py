@@ -0,0 +1,69 @@
+"""
+Tests for the request/response protocol of compile_server.py.
+Run from the repository root: python -m pytest tests
+"""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from compile_server import CompileServer
+
+SOURCE = 'class Main { function void main() { return; } }'
+
+class RespondTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = CompileServer(os.path.join(self.directory.name, 'jack.sock'))
+
+    def tearDown(self):
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_outputs(self):
+        response = self.server.respond({'source': SOURCE, 'outputs': ['tokens', 'vm']})
+        self.assertTrue(response['ok'])
+        self.assertEqual(set(response), {'ok', 'tokens', 'vm'})
+        self.assertEqual(response['vm'].split('\n')[:3], ['function Main.main 0', 'push constant 0', 'return'])
+
+    def test_compile_error_is_located(self):
+        response = self.server.respond({'source': 'class Main {\n function void main() { let = 1; } }'})
+        self.assertFalse(response['ok'])
+        self.assertEqual((response['line'], response['column']), (2, 29))
+
+    def test_invalid_outputs(self):
+        for outputs in ('xml', ['ast'], [['xml']], [{'xml': 1}], [None]):
+            response = self.server.respond({'source': SOURCE, 'outputs': outputs})
+            self.assertFalse(response['ok'], outputs)
+            self.assertIn('outputs must be a list', response['error'])
+
+    def test_missing_source(self):
+        self.assertFalse(self.server.respond({'outputs': ['vm']})['ok'])
+
+class ConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, 'jack.sock')
+        self.server = CompileServer(self.socket_path)
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_bad_requests_dont_end_the_connection(self):
+        lines = [b'not json', b'[1]', json.dumps({'source': SOURCE, 'outputs': [['xml']]}).encode(),
+                 json.dumps({'source': SOURCE, 'outputs': ['vm']}).encode()]
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.socket_path)
+            connection.sendall(b'\n'.join(lines) + b'\n')
+            with connection.makefile('rb') as responses:
+                results = [json.loads(responses.readline()) for _ in lines]
+        self.assertEqual([response['ok'] for response in results], [False, False, False, True])
+        self.assertIn('vm', results[-1])
+
+if __name__ == "__main__":
+    unittest.main()
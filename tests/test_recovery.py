@@ -0,0 +1,47 @@
+"""
+Tests for the recovering parser behind analyzer.py --check.
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+from analyzer import Analyzer
+
+BODY = '''
+    field int x
+    function void f() {
+        let y = ;
+        return;
+    }
+}
+'''
+
+class ClassHeaderTest(unittest.TestCase):
+    def checkErrors(self, header):
+        return [(error.line, error.column) for error in Analyzer(header + BODY).check()]
+
+    def test_misspelled_class_keyword(self):
+        #The header error, then both errors in the body, with no false one at the end of the file
+        self.assertEqual(self.checkErrors('clas A {'), [(1, 1), (3, 5), (4, 17)])
+
+    def test_missing_class_name(self):
+        self.assertEqual(self.checkErrors('class {'), [(1, 7), (3, 5), (4, 17)])
+
+    def test_missing_open_brace(self):
+        #Recovery stops at the first member instead, so the body is still checked
+        self.assertEqual(self.checkErrors('class A'), [(2, 5), (3, 5), (4, 17)])
+
+class ClassMemberTest(unittest.TestCase):
+    def checkErrors(self, source):
+        return [(error.line, error.column) for error in Analyzer(source).check()]
+
+    def test_declaration_missing_its_kind(self):
+        #int x; without field is skipped, and the subroutine after it is still checked
+        source = 'class A {\n int x;\n function void g() { let y = ; return; }\n}'
+        self.assertEqual(self.checkErrors(source), [(2, 2), (3, 30)])
+
+    def test_field_after_subroutine(self):
+        source = 'class A {\n function void f() { return; }\n field int x;\n function void g() { let y = ; return; }\n}'
+        self.assertEqual(self.checkErrors(source), [(3, 2), (4, 30)])
+
+if __name__ == "__main__":
+    unittest.main()
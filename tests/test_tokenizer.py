@@ -0,0 +1,35 @@
+"""
+Tests for scanning sources as str and as bytes, as compileFile does.
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+from compiler import Compiler, CompileError
+from tokenizer import Tokenizer
+
+def scanned(source):
+    """Returns the (type, content) of each token in source, and the problems reported while scanning it"""
+    problems = []
+    tokenizer = Tokenizer(source, report = lambda message, line, column: problems.append((message, line, column)))
+    return [(token.type, token.content) for token in tokenizer.iterTokens(source)], problems
+
+class ScanTest(unittest.TestCase):
+    def test_str_and_bytes_agree(self):
+        source = 'class A {\n var int café;\n let s = "héllo" # 1;\n /* open'
+        self.assertEqual(scanned(source), scanned(source.encode()))
+        tokens, problems = scanned(source)
+        self.assertIn(('identifier', 'caf'), tokens)
+        self.assertIn(('stringConstant', 'héllo'), tokens)
+        self.assertEqual(problems, [("No matches on: 'é'", 2, 13), ("No matches on: '#'", 3, 18),
+                                    ("Unterminated comment", 4, 2)])
+
+    def test_end_of_file_after_string(self):
+        #The error is just past the closing quote, for both kinds of source
+        source = 'class A { function void f() { let s = "abc"'
+        for file in (source, source.encode()):
+            with self.assertRaises(CompileError) as raised:
+                Compiler(file).compileClass()
+            self.assertEqual((raised.exception.line, raised.exception.column), (1, len(source) + 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for the VM optimizer behind analyzer.py -O.
+Run from the repository root: python -m pytest tests
+"""
+
+import unittest
+from vm_optimizer import optimize
+
+FUNCTION = ('function', 'Main.f', 0)
+RETURN = ('return',)
+
+def push(value):
+    return ('push', 'constant', value)
+
+class OptimizeTest(unittest.TestCase):
+    def assertOptimizes(self, body, expected):
+        self.assertEqual(optimize([FUNCTION, *body, RETURN]), [FUNCTION, *expected, RETURN])
+
+    def test_fold_to_minimum(self):
+        #-32768 can't be pushed directly, so it is folded to ~32767
+        self.assertOptimizes([push(32767), ('neg',), push(1), ('sub',)], [push(32767), ('not',)])
+        self.assertOptimizes([push(32767), push(1), ('add',)], [push(32767), ('not',)])
+        self.assertOptimizes([push(32767), ('not',)], [push(32767), ('not',)])
+
+    def test_fold_nested(self):
+        self.assertOptimizes([push(2), push(3), ('call', 'Math.multiply', 2), push(4), ('add',)], [push(10)])
+        self.assertOptimizes([push(7), ('neg',), push(2), ('call', 'Math.divide', 2)], [push(3), ('neg',)])
+
+    def test_if_goto_on_true(self):
+        body = [push(0), ('not',), ('if-goto', 'L1'), push(1), RETURN, ('label', 'L1'), push(2)]
+        self.assertOptimizes(body, [push(2)])
+
+    def test_if_goto_on_false(self):
+        body = [push(0), ('if-goto', 'L1'), push(1), RETURN, ('label', 'L1'), push(2)]
+        self.assertOptimizes(body, [push(1)])
+
+    def test_dead_code_after_return(self):
+        #L1 is still jumped to, so the code after it stays, but nothing jumps to L2
+        body = [('push', 'argument', 0), ('if-goto', 'L1'), push(1), RETURN, push(9), ('pop', 'local', 0),
+                ('label', 'L1'), push(2), RETURN, ('label', 'L2'), push(3)]
+        expected = [('push', 'argument', 0), ('if-goto', 'L1'), push(1), RETURN, ('label', 'L1'), push(2)]
+        self.assertOptimizes(body, expected)
+
+    def test_cancelling_pairs(self):
+        body = [('push', 'argument', 0), ('not',), ('not',), ('push', 'argument', 1), ('neg',), ('neg',), ('add',)]
+        self.assertOptimizes(body, [('push', 'argument', 0), ('push', 'argument', 1), ('add',)])
+
+    def test_identities(self):
+        body = [('push', 'argument', 0), push(1), ('call', 'Math.multiply', 2),
+                ('push', 'argument', 1), push(0), ('sub',), ('add',)]
+        self.assertOptimizes(body, [('push', 'argument', 0), ('push', 'argument', 1), ('add',)])
+
+    def test_divide_by_zero_is_kept(self):
+        body = [push(1), push(0), ('call', 'Math.divide', 2)]
+        self.assertOptimizes(body, body)
+
+if __name__ == "__main__":
+    unittest.main()
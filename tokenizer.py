@@ -1,35 +1,65 @@
 import re
+import sys
+from array import array
+from bisect import bisect_right
+from collections import deque
 import jack_xml
 
 
+#Token types are small ints, which double as the jack_xml tag ids of the matching leaf nodes
+KEYWORD, SYMBOL, IDENTIFIER, INTEGER_CONSTANT, STRING_CONSTANT = \
+    jack_xml.KEYWORD, jack_xml.SYMBOL, jack_xml.IDENTIFIER, jack_xml.INTEGER_CONSTANT, jack_xml.STRING_CONSTANT
+
+def typeName(type):
+    """Returns the name of a token type code, or a list of names for a collection of codes"""
+    if type is None:
+        return None
+    elif isinstance(type, int):
+        return jack_xml.TAGS[type]
+    return [jack_xml.TAGS[code] for code in type]
+
+def printProblem(message, line, column):
+    print(f"Line {line}, column {column}: {message}")
+
 class Token:
-    def __init__(self, type, content):
-        self.type = type
+    __slots__ = ('kind', 'content')
+
+    def __init__(self, kind, content):
+        '''
+        kind - one of the token type codes, e.g. IDENTIFIER
+        content - the text of the token
+        '''
+        self.kind = kind
         self.content = content
+
+    @property
+    def type(self):
+        return jack_xml.TAGS[self.kind]
     
     def toXML(self):
-        return jack_xml.XML(self.type, self.content)
+        return jack_xml.XML(jack_xml.TAGS[self.kind], self.content)
     
     def checkContent(self, compare):
         '''
         Checks if the content of the token matches what is in compare
 
-        compare - a string or a list
+        compare - a string or a collection of strings
         '''
-        if isinstance(compare, list):
-            return self.content in compare
-        else:
+        if type(compare) is str:
             return self.content == compare
+        else:
+            return self.content in compare
     
     def checkType(self, compare):
         '''
         Checks if the type of the token matches what is in compare
+
+        compare - a token type code or a collection of them
         '''
-        
-        if isinstance(compare, list):
-            return self.type in compare
+        if type(compare) is int:
+            return self.kind == compare
         else:
-            return self.type == compare
+            return self.kind in compare
 
 class Tokenizer:
     KEYWORDS = frozenset(('class', 'constructor', 'function', 'method', 'field', 'static', 'var', \
@@ -40,63 +70,186 @@ class Tokenizer:
 
     TOKENTYPE = frozenset(('keyword', 'symbol', 'identifier', 'integerConstant', 'stringConstant'))
 
-    def __init__(self, file):
+    #One alternative per token class, tried in order at each position. The group name is the token type,
+    #except for 'word' (keyword or identifier), 'whitespace' and 'comment' (skipped), 'unterminated' (a comment
+    #running to the end of the file, reported and skipped) and 'unknown' (reported and skipped).
+    #Strings come before comments so that a // inside a string stays part of it.
+    #Jack source is ASCII, so \w, \d and \s are ASCII only, and a run of other characters is reported as one
+    #problem. That way the same source scans the same as str or as bytes
+    TOKEN_PATTERN = r'''
+        (?P<stringConstant>"[^"\n]*")
+        |(?P<comment>//[^\n]*|/\*.*?\*/)
+        |(?P<unterminated>/\*.*)
+        |(?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+        |(?P<integerConstant>\d+)
+        |(?P<word>[a-zA-Z_]\w*)
+        |(?P<whitespace>\s+)
+        |(?P<unknown>[^\x00-\x7f]+|.)
+    '''
+    TOKEN_REGEX = re.compile(TOKEN_PATTERN, re.VERBOSE | re.DOTALL | re.ASCII)
+    #The same pattern over bytes, for scanning a memory-mapped file without decoding all of it
+    BYTES_TOKEN_REGEX = re.compile(TOKEN_PATTERN.encode(), re.VERBOSE | re.DOTALL)
+
+    #Keywords and symbols are shared, so there is only ever one Token object for each
+    KEYWORD_TOKENS = {keyword: Token(KEYWORD, keyword) for keyword in KEYWORDS}
+    SYMBOL_TOKENS = {symbol: Token(SYMBOL, symbol) for symbol in SYMBOLS}
+    #The same tokens keyed by their encoded text, for scanBytes
+    KEYWORD_BYTES = {keyword.encode(): token for keyword, token in KEYWORD_TOKENS.items()}
+    SYMBOL_BYTES = {symbol.encode(): token for symbol, token in SYMBOL_TOKENS.items()}
+
+    def __init__(self, file, report = None):
+        '''
+        report - called as report(message, line, column) for each problem found while scanning, like an unknown
+                 character. By default the problem is printed and the scan carries on
+        '''
         self.file = file
+        self.report = report or printProblem
+        self.source = file #What is being scanned, str or bytes-like
+        #The position each line starts at, filled in as the scan passes newlines
+        self.line_starts = array('L', [0])
     
     def tokenize(self, file):
         """
-        Instead of splitting in spaces and trying to process it, lets try to process token by token
-        """
-        out = []
-        i = 0
-        while i < len(file):
-            #Check for a quote, if so include the whole thing
-            if re.match('\".*\".*', file[i:]):
-                i += 1
-                cur_string = ""
-                while file[i] != '"':
-                    cur_string = cur_string + file[i]
-                    i += 1
-                out.append(Token('stringConstant', cur_string))
-                i += 1
-            #Check for symbol
-            elif file[i] in self.SYMBOLS:
-                out.append(Token("symbol", file[i]))
-                i += 1
-            #Check for an integer
-            elif re.match("\d", file[i]):
-                cur_int = file[i]
-                i += 1
-                while re.match("\d", file[i]):
-                    cur_int = cur_int + file[i]
-                    i += 1
-                out.append(Token("integerConstant", cur_int))
-            else: 
-                #Match longest possible identifier (no whitespace / symbols other than _)
-                identifier_match = re.match("^[a-zA-Z_]\w*", file[i:])
-                if identifier_match:
-                    matched = identifier_match.group()
-                    #Check if keyword or not
-                    if matched in self.KEYWORDS:
-                         out.append(Token("keyword", matched))
-                    else:
-                        #Split based on the periods in the identifeir 
-                        #E.g., Foo.bar splits to tokens with Foo, ., and bar
-                        last = 0
-                        for j , c in enumerate(matched):
-                            if c == '.':
-                                if last != j:
-                                    out.append(Token(type = "identifier", content = matched[last:i]))
-                                last = j+1
-                                out.append(Token(type = "symbol", content = c))
-                            elif j == len(matched) - 1:
-                                out.append(Token(type = "identifier", content = matched[last:i+1]))
-                        
-                    i += len(matched)
+        Returns the full list of tokens in file
+        """
+        return list(self.iterTokens(file))
+
+    def iterTokens(self, file):
+        """
+        Yields the tokens in file, as scan does but without their positions
+        """
+        for token, start, end in self.scan(file):
+            yield token
+
+    def scan(self, file):
+        """
+        Scans the file in a single pass with TOKEN_REGEX, dispatching on the name of the matched group
+        Yields (token, start, end) as they are found, so a consumer can start before the whole file is scanned.
+        start and end are the positions of the token's first character and just past its last, quotes included
+
+        Comments are skipped as part of the same pass, and the starts of lines are recorded as the scan goes,
+        so lineColumn can locate any position that has been scanned
+        Identifiers can't contain '.', so Foo.bar comes out as the tokens Foo, . and bar
+
+        file may also be bytes-like, such as an mmap, which is scanned by scanBytes
+        """
+        if not isinstance(file, str):
+            return self.scanBytes(file)
+        self.source = file
+        return self.scanMatches(self.TOKEN_REGEX.finditer(file), self.KEYWORD_TOKENS, self.SYMBOL_TOKENS, str, '\n')
+
+    def scanBytes(self, data):
+        """
+        Scans bytes-like data as scan does, yielding the same tokens with positions as byte offsets
+        The data is never decoded as a whole: each identifier, integer and string is decoded on its own as it is
+        found, and keywords and symbols are looked up by their bytes, so an mmap of a large file can be compiled
+        without a full-size copy of it in memory
+        """
+        self.source = data
+        return self.scanMatches(self.BYTES_TOKEN_REGEX.finditer(data), self.KEYWORD_BYTES, self.SYMBOL_BYTES,
+                                bytes.decode, b'\n')
+
+    def scanMatches(self, matches, keywords, symbols, text, newline):
+        """
+        The body of scan and scanBytes, which differ only in what they match on
+        keywords and symbols map the matched text to the shared tokens, text turns matched text into a str,
+        and newline is the newline in the type being scanned
+        """
+        for match in matches:
+            kind = match.lastgroup
+            if kind == 'whitespace' or kind == 'comment':
+                self.recordLines(match, newline)
+            elif kind == 'symbol':
+                yield symbols[match.group()], match.start(), match.end()
+            elif kind == 'word':
+                matched = match.group()
+                #Check if keyword or not
+                keyword = keywords.get(matched)
+                if keyword:
+                    yield keyword, match.start(), match.end()
                 else:
-                    if file[i] != " ":
-                        print("No matches on: ", file[i:])
-                    i += 1
-        return out
+                    yield Token(IDENTIFIER, sys.intern(text(matched))), match.start(), match.end()
+            elif kind == 'integerConstant':
+                yield Token(INTEGER_CONSTANT, text(match.group())), match.start(), match.end()
+            elif kind == 'stringConstant':
+                yield Token(STRING_CONSTANT, text(match.group()[1:-1])), match.start(), match.end()
+            elif kind == 'unterminated':
+                self.recordLines(match, newline)
+                self.report("Unterminated comment", *self.lineColumn(match.start()))
+            elif kind == 'unknown':
+                matched = match.group()
+                if not isinstance(matched, str):
+                    matched = matched.decode(errors = 'replace')
+                self.report(f"No matches on: {matched!r}", *self.lineColumn(match.start()))
+
+    def recordLines(self, match, newline = '\n'):
+        """
+        Records where each line starts within a whitespace or comment match, the only tokens that span lines
+        newline is given as bytes when scanning bytes
+        """
+        text = match.group()
+        found = text.find(newline)
+        while found != -1:
+            self.line_starts.append(match.start() + found + 1)
+            found = text.find(newline, found + 1)
+
+    def lineColumn(self, position):
+        """
+        Returns the 1-based (line, column) of a position in the file that has already been scanned
+        When scanning bytes the position is a byte offset, but the column still counts characters, as it does for str
+        """
+        line = bisect_right(self.line_starts, position)
+        start = self.line_starts[line - 1]
+        if isinstance(self.source, str):
+            return line, position - start + 1
+        return line, len(bytes(self.source[start:position]).decode(errors = 'replace')) + 1
+
+
+class TokenStream:
+    """
+    Reads tokens from an iterable of (token, start, end), like Tokenizer.scan, through a small lookahead buffer
+    Only the tokens that have been peeked at but not consumed are held in memory
+    """
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.buffer = deque()
+        self.positions = deque() #Position in the file of each token in buffer
+        self.index = 0 #Number of tokens consumed so far
+        self.end = 0 #Position just past the last token read, for errors at the end of the file
+
+    def peek(self, offset = 0):
+        """
+        Returns the token offset places after the current one without consuming it
+        Returns None when that is past the end of the file
+        """
+        buffer = self.buffer
+        if offset < len(buffer):
+            return buffer[offset]
+        while len(buffer) <= offset:
+            scanned = next(self.tokens, None)
+            if scanned is None:
+                return None
+            token, start, self.end = scanned
+            buffer.append(token)
+            self.positions.append(start)
+        return buffer[offset]
+
+    def position(self):
+        """Returns the position in the file of the current token, or of the end of the last token if there is none"""
+        if self.peek() is None:
+            return self.end
+        return self.positions[0]
+
+    def advance(self):
+        """Consumes and returns the current token, or None at the end of the file"""
+        if not self.buffer and self.peek() is None:
+            return None
+        self.index += 1
+        self.positions.popleft()
+        return self.buffer.popleft()
 
-   
\ No newline at end of file
+    def close(self):
+        """Stops reading from the tokens, closing them if they are a generator like Tokenizer.scan"""
+        close = getattr(self.tokens, 'close', None)
+        if close:
+            close()
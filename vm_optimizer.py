@@ -0,0 +1,160 @@
+"""
+vm_optimizer.py
+
+Shrinks the VM code from CodeGenerator before it is written. Works on VMWriter.commands, the list of command tuples.
+
+- Constant folding: arithmetic on constants, including nested subexpressions, becomes a single constant
+- Peephole: removes push/pop pairs on the same location, not/not and neg/neg, x + 0, x * 1 and similar
+- Branches: if-goto on a constant becomes a goto or disappears, and a goto to the very next label is removed
+- Dead code: commands after a return or goto are removed up to the next label that is still jumped to
+"""
+
+MAX_CONSTANT = 32767
+
+BINARY = {
+    ('add',): lambda a, b: a + b,
+    ('sub',): lambda a, b: a - b,
+    ('and',): lambda a, b: a & b,
+    ('or',): lambda a, b: a | b,
+    ('eq',): lambda a, b: -(a == b),
+    ('lt',): lambda a, b: -(a < b),
+    ('gt',): lambda a, b: -(a > b),
+    ('call', 'Math.multiply', 2): lambda a, b: a * b,
+    #Jack division truncates towards zero, dividing by zero is left for the OS to report
+    ('call', 'Math.divide', 2): lambda a, b: None if b == 0 else abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1),
+}
+UNARY = {
+    ('neg',): lambda a: -a,
+    ('not',): lambda a: ~a,
+}
+#Right operands that leave the left one unchanged
+IDENTITIES = {
+    ('add',): 0,
+    ('sub',): 0,
+    ('or',): 0,
+    ('call', 'Math.multiply', 2): 1,
+    ('call', 'Math.divide', 2): 1,
+}
+CANCELLING = frozenset((('not',), ('neg',)))
+JUMPS = frozenset(('goto', 'if-goto'))
+
+def toInt16(value):
+    """Wraps value to a 16 bit two's complement int, as the Hack platform does"""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+def pushConstant(value):
+    """Returns the commands that push value. The VM can only push 0 to 32767 directly"""
+    if value >= 0:
+        return [('push', 'constant', value)]
+    elif value == -1 or value == -MAX_CONSTANT - 1:
+        return [('push', 'constant', ~value), ('not',)]
+    else:
+        return [('push', 'constant', -value), ('neg',)]
+
+def constantAt(commands, end):
+    """
+    If the commands just before index end push a constant, returns (value, number of commands), otherwise None
+    """
+    if end >= 1 and commands[end - 1][:2] == ('push', 'constant'):
+        return commands[end - 1][2], 1
+    if end >= 2 and commands[end - 2][:2] == ('push', 'constant') and commands[end - 1] in UNARY:
+        return toInt16(UNARY[commands[end - 1]](commands[end - 2][2])), 2
+    return None
+
+def foldConstants(commands):
+    """
+    Folds operations on constants in one pass. Folded results are themselves constants on the end of the output,
+    so nested subexpressions fold all the way up
+    """
+    out = []
+    for command in commands:
+        right = constantAt(out, len(out)) if (command in BINARY or command in UNARY) else None
+        if right is None:
+            out.append(command)
+            continue
+
+        right_value, right_length = right
+        if command in UNARY:
+            #A constant already in its canonical form, like push 5; neg, stays as it is
+            if right_length == 1 or command != out[-1]:
+                del out[len(out) - right_length:]
+                out.extend(pushConstant(toInt16(UNARY[command](right_value))))
+            else:
+                out.append(command)
+            continue
+
+        left = constantAt(out, len(out) - right_length)
+        if left is not None:
+            result = BINARY[command](left[0], right_value)
+            if result is not None:
+                del out[len(out) - right_length - left[1]:]
+                out.extend(pushConstant(toInt16(result)))
+                continue
+        if IDENTITIES.get(command) == right_value:
+            #x op identity is just x
+            del out[len(out) - right_length:]
+            continue
+        out.append(command)
+    return out
+
+def peephole(commands):
+    """Removes commands that have no effect, and simplifies branches on constants"""
+    out = []
+    for command in commands:
+        previous = out[-1] if out else None
+        if command[0] == 'pop' and previous and previous[0] == 'push' and previous[1:] == command[1:]:
+            #Pushing a value then popping it straight back
+            out.pop()
+        elif command in CANCELLING and previous == command:
+            out.pop()
+        elif command[0] == 'if-goto' and constantAt(out, len(out)) is not None:
+            value, length = constantAt(out, len(out))
+            del out[len(out) - length:]
+            if value != 0:
+                out.append(('goto', command[1]))
+        elif command[0] == 'label' and previous == ('goto', command[1]):
+            out[-1] = command
+        else:
+            out.append(command)
+    return out
+
+def removeDeadCode(commands):
+    """
+    Removes commands that can never run: those after a return or goto, up to the next label that is jumped to,
+    and labels that nothing jumps to
+    """
+    #Labels are local to a function, so collect the ones that are used per function
+    used = set()
+    function = None
+    for command in commands:
+        if command[0] == 'function':
+            function = command[1]
+        elif command[0] in JUMPS:
+            used.add((function, command[1]))
+
+    out = []
+    reachable = True
+    function = None
+    for command in commands:
+        if command[0] == 'function':
+            function = command[1]
+            reachable = True
+        elif command[0] == 'label':
+            if (function, command[1]) not in used:
+                continue
+            reachable = True
+        if reachable:
+            out.append(command)
+            if command[0] == 'return' or command[0] == 'goto':
+                reachable = False
+    return out
+
+def optimize(commands):
+    """Returns an optimized copy of commands, a list of VM command tuples"""
+    commands = foldConstants(commands)
+    while True:
+        length = len(commands)
+        commands = removeDeadCode(peephole(commands))
+        if len(commands) == length:
+            return commands
@@ -0,0 +1,49 @@
+"""
+vm_writer.py
+
+Collects VM commands for a class and writes them out as a .vm file.
+"""
+
+class VMWriter:
+    def __init__(self):
+        """
+        Commands are kept as tuples, e.g. ('push', 'constant', 7), and only turned into text when written,
+        so the whole file goes out in one write instead of one per command
+        """
+        self.commands = []
+
+    def writePush(self, segment, index):
+        self.commands.append(('push', segment, index))
+
+    def writePop(self, segment, index):
+        self.commands.append(('pop', segment, index))
+
+    def writeArithmetic(self, command):
+        """command is one of add, sub, neg, eq, gt, lt, and, or, not"""
+        self.commands.append((command,))
+
+    def writeLabel(self, label):
+        self.commands.append(('label', label))
+
+    def writeGoto(self, label):
+        self.commands.append(('goto', label))
+
+    def writeIf(self, label):
+        self.commands.append(('if-goto', label))
+
+    def writeCall(self, name, n_args):
+        self.commands.append(('call', name, n_args))
+
+    def writeFunction(self, name, n_locals):
+        self.commands.append(('function', name, n_locals))
+
+    def writeReturn(self):
+        self.commands.append(('return',))
+
+    def display(self):
+        """Returns the commands as the text of a .vm file"""
+        return ''.join([' '.join(map(str, command)) + '\n' for command in self.commands])
+
+    def write(self, stream):
+        """Writes the commands to stream, a file-like object"""
+        stream.write(self.display())
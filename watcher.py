@@ -0,0 +1,195 @@
+"""
+watcher.py
+
+Watch mode, for interactive development: recompiles each .jack file as soon as it changes, instead of the whole
+directory being compiled again by hand after every edit.
+
+The files are polled every POLL_INTERVAL seconds with os.scandir, which is cheap enough for projects with
+hundreds of classes and needs nothing beyond the standard library. A file whose mtime and size are unchanged is
+taken to be unchanged. Otherwise its contents are hashed, so that saving a file without editing it, or a checkout
+that puts back the same contents, doesn't cause a recompile. Changed files are compiled in a pool of worker
+processes while polling carries on.
+"""
+
+import hashlib
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from analyzer import tryCompileFile, printSummary
+
+POLL_INTERVAL = 0.1
+
+class FileState:
+    __slots__ = ('mtime', 'size', 'digest')
+
+    def __init__(self, mtime, size, digest):
+        self.mtime = mtime #st_mtime_ns
+        self.size = size
+        self.digest = digest #Hash of the contents
+
+def fileDigest(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size = 16).digest()
+
+class Watcher:
+    def __init__(self, directory = None, file_paths = ()):
+        """
+        Watches every .jack file under directory, including ones added later, or just the files in file_paths
+        """
+        self.directory = directory
+        self.file_paths = list(file_paths)
+        self.files = {} #Path of each .jack file seen on the last poll to its FileState
+
+    def scan(self):
+        """Yields (path, stat) for each watched file that exists"""
+        if self.directory is None:
+            for path in self.file_paths:
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    pass
+            return
+
+        #Walked as os.walk does for findJackFiles, so that paths are spelled the same way
+        pending = [self.directory]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks = False):
+                            pending.append(entry.path)
+                        elif entry.name.endswith('.jack'):
+                            yield entry.path, entry.stat()
+                    except OSError:
+                        #Removed since the directory was listed
+                        pass
+
+    def poll(self):
+        """
+        Compares the files with the last poll
+        Returns (changed, removed): the paths of the files that are new or have different contents, and of those
+        that have gone
+        """
+        changed = []
+        seen = set()
+        for path, stat in self.scan():
+            seen.add(path)
+            state = self.files.get(path)
+            if state is not None and state.mtime == stat.st_mtime_ns and state.size == stat.st_size:
+                continue
+            try:
+                digest = fileDigest(path)
+            except OSError:
+                continue
+            if state is None or state.digest != digest:
+                changed.append(path)
+            self.files[path] = FileState(stat.st_mtime_ns, stat.st_size, digest)
+
+        removed = [path for path in self.files if path not in seen]
+        for path in removed:
+            del self.files[path]
+        return changed, removed
+
+def ignoreInterrupts():
+    """Run in each worker, so that Ctrl-C stops just the watcher, which then shuts the workers down"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def watch(watcher, jobs = 1, cache = None, optimize = False, binary = False, interval = POLL_INTERVAL):
+    """
+    Compiles every watched file, then each file that changes, until interrupted
+    Once every compile in flight has finished, the errors and a summary are printed for the files compiled since
+    the last summary. A file that changes again while it is being compiled is compiled again afterwards
+
+    A worker can die while compiling, for instance from SIGBUS when an editor truncates a file that is mapped in
+    memory. That breaks the whole pool, and loses every compile in it, so a new pool is started and the files
+    that were being compiled are tried again one at a time. A file that breaks the pool on its own is reported
+    as failed, until it changes
+    """
+    compile_one = partial(tryCompileFile, cache = cache, optimize = optimize, binary = binary)
+    pool = ProcessPoolExecutor(max_workers = jobs, initializer = ignoreInterrupts)
+    compiling = {} #Future for each file being compiled to its path
+    stale = set() #Files that changed while being compiled
+    retries = [] #Files whose compile was lost when the pool broke, to be tried again alone
+    retrying = None #The file from retries being compiled, if any
+    results = []
+    started = None #When the first of the compiles for the next summary was started
+
+    def submit(path):
+        nonlocal started
+        if started is None:
+            started = time.perf_counter()
+        compiling[pool.submit(compile_one, path)] = path
+
+    def restart():
+        """Replaces the broken pool, and queues the files that were being compiled in it to be tried again"""
+        nonlocal pool, retrying
+        pool.shutdown(wait = False, cancel_futures = True)
+        pool = ProcessPoolExecutor(max_workers = jobs, initializer = ignoreInterrupts)
+        lost = set(compiling.values())
+        alone = lost == {retrying}
+        retrying = None
+        compiling.clear()
+        for path in lost:
+            if alone and path not in stale:
+                results.append((path, "A worker died while compiling the file", None))
+            elif path not in retries:
+                retries.append(path)
+            stale.discard(path)
+
+    try:
+        while True:
+            changed, removed = watcher.poll()
+            for path in removed:
+                print(f"{path}: removed", flush = True)
+            busy = set(compiling.values())
+            for path in changed:
+                if path in busy:
+                    stale.add(path)
+                elif path not in retries:
+                    submit(path)
+
+            if retries and not compiling:
+                retrying = retries.pop()
+                submit(retrying)
+            if not compiling:
+                time.sleep(interval)
+                continue
+            done, pending = wait(compiling, timeout = interval, return_when = FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path = compiling[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    continue
+                except Exception as e:
+                    result = (path, f"{type(e).__name__}: {e}", None)
+                del compiling[future]
+                if path == retrying:
+                    retrying = None
+                results.append(result)
+                if path in stale:
+                    stale.discard(path)
+                    submit(path)
+            if broken:
+                print("A worker died while compiling, restarting the workers", flush = True)
+                restart()
+            if not compiling and not retries:
+                printSummary(results)
+                print(f"Finished in {(time.perf_counter() - started) * 1000:.0f} ms, watching for changes", flush = True)
+                if cache:
+                    cache.evict()
+                results = []
+                started = None
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        pool.shutdown(cancel_futures = True)